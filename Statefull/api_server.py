@@ -1,48 +1,119 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import uvicorn
-from src.graph import start_joke_generation, continue_with_explanation, get_thread_status
+from src.startup import startup_phase, get_startup_report  # starts the startup clock
+
+from contextlib import asynccontextmanager
+from typing import Optional
+with startup_phase("import fastapi"):
+    from fastapi import FastAPI, HTTPException, Header, Response
+    from fastapi.concurrency import run_in_threadpool
+    from pydantic import BaseModel
+    import uvicorn
+import asyncio
+import hmac
+with startup_phase("import src"):
+    from src.graph import (
+        start_joke_generation, continue_with_explanation, get_thread_status,
+        astart_joke_generation, acontinue_with_explanation, aget_thread_status,
+        run_checkpoint_retention, cached_checkpoint_id, aclose_persistence
+    )
+    from src.config import get_llm_stats, ASYNC_EXECUTION, EXECUTION_MODE
+    from src.cache import get_cache_stats
+    from src.breaker import get_breaker_stats
+    from src.speculation import get_speculation_stats
+    from src.state_cache import get_state_cache_stats
+    from src.persistence import get_pool_stats, get_checkpointer_backend, check_checkpointer_config
+    from src.retention import get_retention_stats, RetentionInProgress, RETENTION_ADMIN_TOKEN
+    from src.llm import get_singleflight_stats, get_limiter_stats, get_hedging_stats
+    from src.readiness import warm_up as readiness_warm_up, is_ready, get_readiness
+
+@asynccontextmanager
+async def lifespan(app):
+    # A misconfigured backend stops the server here rather than leaving /ready at 503
+    check_checkpointer_config()
+    # Warm up in the background so the server accepts connections (and answers
+    # /health) right away; /ready turns 200 when it is done, and requests
+    # arriving meanwhile wait for the workflow
+    warm_up = asyncio.create_task(readiness_warm_up())
+    yield
+    warm_up.cancel()
+    await aclose_persistence()
 
 # Create stateful FastAPI app
 app = FastAPI(
     title="Stateful Joke Generation API", 
     version="2.0.0",
-    description="API with persistent state management for joke generation"
+    description="API with persistent state management for joke generation",
+    lifespan=lifespan
 )
 
 # Request models
 class StartRequest(BaseModel):
     topic: str
     thread_id: str
+    no_cache: bool = False
 
 class ContinueRequest(BaseModel):
     thread_id: str
+    no_cache: bool = False
 
 class StatusRequest(BaseModel):
     thread_id: str
 
+class RetentionRequest(BaseModel):
+    dry_run: bool = False
+    # Override the RETENTION_* defaults for this run (seconds)
+    completed_ttl: Optional[float] = None
+    abandoned_ttl: Optional[float] = None
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Stateful Joke Generation API is running!",
         "version": "2.0.0(Statefull)",
         "endpoints": [
-            "/health",
+            "/health - Liveness",
+            "/ready - Readiness (503 until warmed up)",
+            "/metrics - LLM client and pool metrics",
             "/start - Start joke generation",
             "/continue - Generate explanation",
-            "/status - Check thread status"
+            "/status - Check thread status",
+            "/admin/retention - Delete expired threads and compact checkpoints"
         ]
     }
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy", "persistence": "SQLite"}
+async def health_check():
+    return {"status": "healthy", "persistence": get_checkpointer_backend(), "execution_mode": EXECUTION_MODE, "llm_breakers": get_breaker_stats()}
+
+@app.get("/ready")
+async def ready_check(response: Response):
+    # Route traffic on this, not /health: it waits for the pool, LLM client and caches
+    if not is_ready():
+        response.status_code = 503
+    return get_readiness()
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "llm_clients": get_llm_stats(),
+        "llm_cache": get_cache_stats(),
+        "llm_limiter": get_limiter_stats(),
+        "llm_hedging": get_hedging_stats(),
+        "llm_singleflight": get_singleflight_stats(),
+        "speculation": get_speculation_stats(),
+        "state_cache": get_state_cache_stats(),
+        "postgres_pool": get_pool_stats(),
+        "retention": get_retention_stats(),
+        "startup": get_startup_report()
+    }
 
 @app.post("/start")
-def start_endpoint(request: StartRequest):
+async def start_endpoint(request: StartRequest):
     try:
         print(f"API /start - topic: {request.topic}, thread: {request.thread_id}")
-        result = start_joke_generation(request.topic, request.thread_id)
+        if ASYNC_EXECUTION:
+            result = await astart_joke_generation(request.topic, request.thread_id, request.no_cache)
+        else:
+            result = await run_in_threadpool(start_joke_generation, request.topic, request.thread_id, request.no_cache)
         
         return {
             "success": True,
@@ -57,10 +128,13 @@ def start_endpoint(request: StartRequest):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/continue")
-def continue_endpoint(request: ContinueRequest):
+async def continue_endpoint(request: ContinueRequest):
     try:
         print(f"API /continue - thread: {request.thread_id}")
-        result = continue_with_explanation(request.thread_id)
+        if ASYNC_EXECUTION:
+            result = await acontinue_with_explanation(request.thread_id, request.no_cache)
+        else:
+            result = await run_in_threadpool(continue_with_explanation, request.thread_id, request.no_cache)
         
         return {
             "success": True,
@@ -78,15 +152,34 @@ def continue_endpoint(request: ContinueRequest):
         print(f"API error in /continue: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+def _etag(checkpoint_id):
+    return f'"{checkpoint_id}"'
+
+def _etag_matches(if_none_match, etag):
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
 @app.post("/status")
-def status_endpoint(request: StatusRequest):
+async def status_endpoint(request: StatusRequest, response: Response, if_none_match: Optional[str] = Header(None)):
     try:
         print(f"API /status - thread: {request.thread_id}")
-        result = get_thread_status(request.thread_id)
+        if if_none_match:
+            # Unchanged since the client's last poll: no DB query, no body
+            checkpoint_id = cached_checkpoint_id(request.thread_id)
+            if checkpoint_id and _etag_matches(if_none_match, _etag(checkpoint_id)):
+                return Response(status_code=304, headers={"ETag": _etag(checkpoint_id)})
+        if ASYNC_EXECUTION:
+            result = await aget_thread_status(request.thread_id)
+        else:
+            result = await run_in_threadpool(get_thread_status, request.thread_id)
         
         if not result.get('exists'):
             raise HTTPException(status_code=404, detail=result.get('message'))
         
+        # The status is derived from the latest checkpoint, so its id is a strong validator
+        etag = _etag(result['checkpoint_id'])
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
         return {
             "success": True,
             **result
@@ -97,6 +190,30 @@ def status_endpoint(request: StatusRequest):
         print(f"API error in /status: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.post("/admin/retention")
+async def retention_endpoint(request: RetentionRequest, x_admin_token: Optional[str] = Header(None)):
+    if not RETENTION_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Retention endpoint is disabled (set RETENTION_ADMIN_TOKEN)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, RETENTION_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    options = {'dry_run': request.dry_run}
+    if request.completed_ttl is not None:
+        options['completed_ttl'] = request.completed_ttl
+    if request.abandoned_ttl is not None:
+        options['abandoned_ttl'] = request.abandoned_ttl
+    try:
+        print(f"API /admin/retention - dry_run: {request.dry_run}")
+        # Batches are short sync transactions; keep them off the event loop
+        report = await run_in_threadpool(run_checkpoint_retention, **options)
+        return {"success": True, **report}
+    except RetentionInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"API error in /admin/retention: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
 # if __name__ == "__main__":
 #     print("Starting Stateful Joke Generation API server on port 8000...")
 #     print("Endpoints available:")
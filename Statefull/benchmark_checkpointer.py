@@ -0,0 +1,135 @@
+"""
+Checkpointer benchmark: write/read latency and throughput per backend.
+
+Each simulated conversation does what /start and /continue do to the
+checkpointer: put the joke checkpoint, read it back, put the explanation
+checkpoint and read the final state.
+
+    python benchmark_checkpointer.py --backends sqlite,memory --conversations 500 --concurrency 8
+
+The postgres backend uses POSTGRES_DATABASE_URL and the POSTGRES_POOL_* settings.
+SQLite writes to a temporary database unless --sqlite-path is given.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+
+from src.persistence import create_checkpointer
+
+JOKE = "Why did the checkpoint cross the road? To get to the other WAL. " * 2
+EXPLANATION = "The joke plays on write-ahead logging, which SQLite and Postgres use for durability. " * 4
+
+
+def _put(saver, thread_id, previous, step, values):
+    checkpoint = empty_checkpoint()
+    checkpoint['id'] = str(uuid6(clock_seq=step))
+    versions = dict(previous['channel_versions']) if previous else {}
+    new_versions = {channel: saver.get_next_version(versions.get(channel), None) for channel in values}
+    checkpoint['channel_values'] = {**(previous['channel_values'] if previous else {}), **values}
+    checkpoint['channel_versions'] = {**versions, **new_versions}
+    config = {'configurable': {'thread_id': thread_id, 'checkpoint_ns': ''}}
+    if previous:
+        config['configurable']['checkpoint_id'] = previous['id']
+    saver.put(config, checkpoint, {'source': 'loop', 'step': step, 'parents': {}}, new_versions)
+    return checkpoint
+
+
+def _conversation(saver, timings):
+    thread_id = str(uuid.uuid4())
+    config = {'configurable': {'thread_id': thread_id}}
+
+    def timed(kind, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings[kind].append(time.perf_counter() - started)
+        return result
+
+    joke = timed('write', _put, saver, thread_id, None, 1,
+                 {'topic': 'databases', 'joke': JOKE, 'explanation': None, 'status': 'joke_generated'})
+    timed('read', saver.get_tuple, config)
+    timed('write', _put, saver, thread_id, joke, 2, {'explanation': EXPLANATION, 'status': 'completed'})
+    timed('read', saver.get_tuple, config)
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+    return {
+        'ops': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+    }
+
+
+def run_backend(backend, conversations, concurrency, sqlite_path=None):
+    saver = create_checkpointer(backend, sqlite_path=sqlite_path, setup=True)
+    timings = {'write': [], 'read': []}
+    # Warm up connections and caches outside the measurement
+    for _ in range(min(concurrency, conversations)):
+        _conversation(saver, {'write': [], 'read': []})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(_conversation, saver, timings) for _ in range(conversations)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'backend': backend,
+        'conversations': conversations,
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'conversations_per_s': round(conversations / elapsed, 1),
+        'ops_per_s': round((len(timings['write']) + len(timings['read'])) / elapsed, 1),
+        'write': _summary(timings['write']),
+        'read': _summary(timings['read']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark checkpointer backends.")
+    parser.add_argument('--backends', default="sqlite,memory", help="comma-separated: postgres, sqlite, memory")
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--sqlite-path', help="database file (default: a temporary file)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            if backend == 'postgres' and not os.getenv("POSTGRES_DATABASE_URL"):
+                print("Skipping postgres: POSTGRES_DATABASE_URL is not set")
+                continue
+            sqlite_path = args.sqlite_path or os.path.join(tmp, "benchmark.db")
+            results.append(run_backend(backend, args.conversations, args.concurrency, sqlite_path))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print("=" * 96)
+    print(f"{'backend':<10}{'conv/s':>9}{'ops/s':>9}"
+          f"{'write p50':>11}{'p95':>8}{'p99':>8}{'read p50':>11}{'p95':>8}{'p99':>8}   (ms)")
+    print("-" * 96)
+    for r in results:
+        w, rd = r['write'], r['read']
+        print(f"{r['backend']:<10}{r['conversations_per_s']:>9}{r['ops_per_s']:>9}"
+              f"{w['p50_ms']:>11}{w['p95_ms']:>8}{w['p99_ms']:>8}{rd['p50_ms']:>11}{rd['p95_ms']:>8}{rd['p99_ms']:>8}")
+    print("=" * 96)
+
+
+if __name__ == "__main__":
+    main()
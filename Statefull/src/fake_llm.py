@@ -0,0 +1,202 @@
+"""Deterministic offline chat model for load tests and benchmarks.
+
+Selected with ``MODEL_NAME=fake:<name>``. Responses are derived from a hash of
+the prompt, so the same prompt always yields the same text, while latency,
+errors and throttling are drawn from a seeded random generator. Prompts asking
+for 'a JSON object with the keys "a" and "b"' get a JSON object back.
+
+Environment:
+    FAKE_LLM_LATENCY: "fixed:<seconds>", "lognormal:<median>,<sigma>" or
+        "recorded:<path>" (one latency in seconds per line, sampled at random)
+    FAKE_LLM_TOKEN_DELAY: seconds between streamed tokens
+    FAKE_LLM_RESPONSE_TOKENS: number of words in each response
+    FAKE_LLM_ERROR_RATE: fraction of calls failing with a 503
+    FAKE_LLM_THROTTLE_RATE: fraction of calls failing with a 429
+    FAKE_LLM_RPS_LIMIT: simulated quota in requests/second (0 disables)
+    FAKE_LLM_SEED: seed for latency and failure sampling
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+_WORDS = (
+    "why did the {topic} cross the road to get to the other side because "
+    "nobody expected a punchline quite like this one and everyone laughed "
+    "at the clever twist hidden in plain sight"
+).split()
+
+
+class FakeLLMError(Exception):
+    """Simulated upstream failure."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = status_code
+
+
+def parse_latency(spec):
+    """Parse a FAKE_LLM_LATENCY spec into a sampler taking a Random."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    kind = kind.strip().lower()
+
+    if kind == "fixed":
+        value = float(args or 0)
+        return lambda rng: value
+
+    if kind == "lognormal":
+        median, _, sigma = args.partition(",")
+        mu = math.log(float(median))
+        sigma = float(sigma or 0.5)
+        return lambda rng: rng.lognormvariate(mu, sigma)
+
+    if kind == "recorded":
+        with open(args) as f:
+            samples = [float(line) for line in f if line.strip()]
+        if not samples:
+            raise ValueError(f"No latency samples found in {args}")
+        return lambda rng: rng.choice(samples)
+
+    raise ValueError(f"Unknown FAKE_LLM_LATENCY distribution: {kind}")
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers locally with simulated latency and failures."""
+
+    model: str = "fake"
+    latency: str = "fixed:0"
+    token_delay: float = 0.0
+    response_tokens: int = 24
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    rps_limit: float = 0.0
+    seed: Optional[int] = None
+
+    _rng: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _sampler: Any = PrivateAttr()
+    _window: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._sampler = parse_latency(self.latency)
+        self._window = [0.0, 0]
+
+    @classmethod
+    def from_env(cls, model="fake", **settings):
+        """Build a fake model configured from FAKE_LLM_* environment variables."""
+        seed = os.getenv("FAKE_LLM_SEED")
+        params = {
+            'model': model,
+            'latency': os.getenv("FAKE_LLM_LATENCY", "fixed:0"),
+            'token_delay': float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0")),
+            'response_tokens': int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "24")),
+            'error_rate': float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            'throttle_rate': float(os.getenv("FAKE_LLM_THROTTLE_RATE", "0")),
+            'rps_limit': float(os.getenv("FAKE_LLM_RPS_LIMIT", "0")),
+            'seed': int(seed) if seed else None,
+        }
+        params.update(settings)
+        return cls(**params)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _plan_call(self):
+        """Sample latency and decide whether this call fails."""
+        with self._lock:
+            delay = max(0.0, self._sampler(self._rng))
+            roll = self._rng.random()
+
+            if self.rps_limit:
+                now = time.monotonic()
+                if now - self._window[0] >= 1.0:
+                    self._window[0], self._window[1] = now, 0
+                self._window[1] += 1
+                if self._window[1] > self.rps_limit:
+                    return delay, FakeLLMError("429 RESOURCE_EXHAUSTED: simulated quota exceeded", 429)
+
+        if roll < self.throttle_rate:
+            return delay, FakeLLMError("429 RESOURCE_EXHAUSTED: simulated rate limit", 429)
+        if roll < self.throttle_rate + self.error_rate:
+            return delay, FakeLLMError("503 UNAVAILABLE: simulated upstream error", 503)
+        return delay, None
+
+    def _text(self, seed, topic):
+        digest = hashlib.sha256(f"{self.model}\n{seed}".encode()).digest()
+        words = [
+            _WORDS[digest[i % len(digest)] % len(_WORDS)].format(topic=topic)
+            for i in range(self.response_tokens)
+        ]
+        return f"[{self.model}:{digest.hex()[:8]}] " + " ".join(words)
+
+    def _respond(self, messages):
+        """Deterministic response text for a prompt."""
+        prompt = "\n".join(str(m.content) for m in messages)
+        topic = prompt.split()[-1] if prompt.split() else "topic"
+        keys = re.search(r"JSON object with the keys (.+?)\.", prompt)
+        if keys:
+            fields = re.findall(r'"(\w+)"', keys.group(1))
+            return json.dumps({field: self._text(f"{prompt}\n{field}", topic) for field in fields})
+        return self._text(prompt, topic)
+
+    def _tokens(self, text):
+        words = text.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, error = self._plan_call()
+        time.sleep(delay)
+        if error:
+            raise error
+        text = self._respond(messages)
+        time.sleep(self.token_delay * len(self._tokens(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, error = self._plan_call()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        text = self._respond(messages)
+        await asyncio.sleep(self.token_delay * len(self._tokens(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, error = self._plan_call()
+        time.sleep(delay)
+        if error:
+            raise error
+        for token in self._tokens(self._respond(messages)):
+            time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, error = self._plan_call()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        for token in self._tokens(self._respond(messages)):
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
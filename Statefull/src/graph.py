@@ -1,65 +1,157 @@
-from langgraph.graph import StateGraph, START, END
-# from langgraph.checkpoint.sqlite import SqliteSaver
+import asyncio
+import threading
+from langgraph.constants import START, END
 from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.sqlite import SqliteSaver
 from .models import JokeState
-from .core import generate_joke, generate_explanation
-# import sqlite3
-from psycopg_pool import ConnectionPool
-import os
+from .core import generate_joke, generate_explanation, agenerate_joke, agenerate_explanation
+from .llm import request_options
+from .speculation import get_speculator
+from .persistence import (
+    create_checkpointer, acreate_checkpointer, aclose_checkpointer,
+    ASYNC_POSTGRES_CHECKPOINTER, POSTGRES_DATABASE_URL, ThreadLocalSqliteSaver
+)
+from .retention import run_retention
+from .state_cache import get_state_cache
+from .startup import startup_phase
 
-# Database file for persistent storage
-DB_PATH = "checkpoints.db"
 
-def create_workflow():
+def create_workflow(checkpointer=None):
     print("Setting up stateful joke generation workflow")
+    # Deferred until the workflow is built: langgraph takes ~0.6s to import
+    with startup_phase("import langgraph"):
+        from langgraph.graph import StateGraph
+        from langchain_core.runnables import RunnableLambda
     
     # Create the state graph
     graph = StateGraph(JokeState)
     
-    # Add nodes
-    graph.add_node('generate_joke', generate_joke)
-    graph.add_node('generate_explanation', generate_explanation)
+    # Add nodes (sync function for invoke, async function for ainvoke)
+    graph.add_node('generate_joke', RunnableLambda(generate_joke, afunc=agenerate_joke, name='generate_joke'))
+    graph.add_node('generate_explanation', RunnableLambda(generate_explanation, afunc=agenerate_explanation, name='generate_explanation'))
     
     # Add edges
     graph.add_edge(START, 'generate_joke')
     graph.add_edge('generate_joke', 'generate_explanation')
     graph.add_edge('generate_explanation', END)
     
-    # Create SQLite connection and checkpointer
-    # SqliteSaver needs to be created with a connection
-    # conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    # checkpointer = SqliteSaver(conn)
+    # Postgres, SQLite or in-memory checkpointer, selected by CHECKPOINTER
+    if checkpointer is None:
+        with startup_phase("open checkpointer"):
+            checkpointer = create_checkpointer()
     
-    # print("SQLite checkpointer initialized",checkpointer)
     # Compile the workflow with interrupt AFTER joke generation
-
-    # PostgresSaver requires psycopg3 connection pool
-    connection_kwargs = {
-        "autocommit": True,
-        "prepare_threshold": 0,
-    }
-    pool = ConnectionPool(
-        conninfo=os.getenv('POSTGRES_DATABASE_URL'),
-        max_size=20,
-        kwargs=connection_kwargs,
-    )
-    checkpointer = PostgresSaver(pool)
-    checkpointer.setup()  # Create tables if they don't exist
-    print("Postgres checkpointer initialized", checkpointer)
-    
     workflow = graph.compile(
         checkpointer=checkpointer,
         interrupt_after=['generate_joke']
     )
-    print("Workflow setup completed with PostgreSQL persistence")
+    print("Workflow setup completed with persistence")
     
     return workflow
-# Create global workflow instance
-workflow = create_workflow()
 
-def start_joke_generation(topic: str, thread_id: str):
+_workflow = None
+_workflow_lock = threading.Lock()
+_aworkflow_lock = asyncio.Lock()
+
+
+def get_workflow():
+    """The compiled workflow, built on first use (normally at server startup)."""
+    global _workflow
+    if _workflow is None:
+        if ASYNC_POSTGRES_CHECKPOINTER:
+            # Its pool belongs to the event loop; aget_workflow opens it
+            raise RuntimeError("The async Postgres workflow is opened by aget_workflow in the event loop")
+        with _workflow_lock:
+            if _workflow is None:
+                with startup_phase("build workflow"):
+                    _workflow = create_workflow()
+    return _workflow
+
+
+async def aget_workflow():
+    """get_workflow for async code: a first-time build runs off the event loop,
+    or opens the async Postgres pool on it."""
+    global _workflow
+    if _workflow is not None:
+        return _workflow
+    if not ASYNC_POSTGRES_CHECKPOINTER:
+        return await asyncio.to_thread(get_workflow)
+    async with _aworkflow_lock:
+        if _workflow is None:
+            with startup_phase("build workflow"):
+                with startup_phase("open checkpointer"):
+                    checkpointer = await acreate_checkpointer()
+                _workflow = create_workflow(checkpointer)
+    return _workflow
+
+
+async def aopen_persistence():
+    """Build the workflow and open its checkpointer (lifespan startup)."""
+    await aget_workflow()
+
+
+async def aclose_persistence():
+    """Close the async Postgres pool (lifespan shutdown)."""
+    global _workflow
+    if ASYNC_POSTGRES_CHECKPOINTER:
+        _workflow = None
+        await aclose_checkpointer()
+
+
+def cached_checkpoint_id(thread_id: str):
+    """Latest checkpoint id of a thread if the state cache holds it (no DB query)."""
+    cache = get_state_cache()
+    return cache.checkpoint_id(thread_id) if cache is not None else None
+
+
+def run_checkpoint_retention(**options):
+    """Run the retention policy against the workflow's checkpointer."""
+    if ASYNC_POSTGRES_CHECKPOINTER:
+        # Retention batches are sync; give them their own short-lived connection
+        with PostgresSaver.from_conn_string(POSTGRES_DATABASE_URL) as saver:
+            return run_retention(saver, **options)
+    checkpointer = get_workflow().checkpointer
+    if isinstance(checkpointer, ThreadLocalSqliteSaver):
+        # Its conn is the calling thread's request connection; batches change
+        # busy_timeout and hold the write lock, so they get a connection of their own
+        with SqliteSaver.from_conn_string(checkpointer.path) as saver:
+            return run_retention(saver, **options)
+    return run_retention(checkpointer, **options)
+
+
+def _speculate(thread_id, state):
+    """Start the explanation in a worker thread while the client reads the joke."""
+    speculator = get_speculator()
+    if speculator is not None and state.get('joke') and state.get('status') != 'error':
+        speculator.submit(thread_id, state['joke'], generate_explanation, dict(state))
+
+
+def _aspeculate(thread_id, state):
+    """Async version of _speculate: the explanation runs as a task on the event loop."""
+    speculator = get_speculator()
+    if speculator is not None and state.get('joke') and state.get('status') != 'error':
+        speculator.asubmit(thread_id, state['joke'], agenerate_explanation(dict(state)))
+
+
+def _take_speculation(thread_id, snapshot, no_cache):
+    """Staged explanation future for a thread paused before generate_explanation."""
+    speculator = get_speculator()
+    if speculator is None:
+        return None
+    if no_cache or 'generate_explanation' not in snapshot.next:
+        speculator.discard(thread_id)
+        return None
+    return speculator.take(thread_id, snapshot.values.get('joke'))
+
+
+def _usable(update):
+    # Failed speculation falls back to running the node, which may succeed this time
+    return bool(update) and update.get('status') != 'error'
+
+def start_joke_generation(topic: str, thread_id: str, no_cache: bool = False):
     try:
         config = {"configurable": {"thread_id": thread_id}}
+        workflow = get_workflow()
         print(f"Starting joke generation for topic: {topic}, thread: {thread_id}")
         
         # Initial state
@@ -70,7 +162,9 @@ def start_joke_generation(topic: str, thread_id: str):
             'status': 'started'
         }
         
-        result = workflow.invoke(initial_state, config=config)
+        with request_options(no_cache=no_cache):
+            result = workflow.invoke(initial_state, config=config)
+            _speculate(thread_id, result)
         print(f"Joke generation completed for thread: {thread_id}")
         
         return {
@@ -84,9 +178,10 @@ def start_joke_generation(topic: str, thread_id: str):
         raise
 
 
-def continue_with_explanation(thread_id: str):
+def continue_with_explanation(thread_id: str, no_cache: bool = False):
     try:
         config = {"configurable": {"thread_id": thread_id}}
+        workflow = get_workflow()
         print(f"Continuing workflow for thread: {thread_id}")
         
         # Get current state to verify it exists
@@ -99,8 +194,23 @@ def continue_with_explanation(thread_id: str):
         if not current_state.values.get('joke'):
             raise ValueError(f"No joke found for thread_id: {thread_id}. Start workflow first.")
         
-        # Continue from where we left off (None means continue with no new input)
-        result = workflow.invoke(None, config=config)
+        update = None
+        staged = _take_speculation(thread_id, current_state, no_cache)
+        if staged is not None:
+            try:
+                update = staged.result()
+            except Exception as e:
+                print(f"Speculative explanation failed for thread {thread_id}: {str(e)}")
+
+        if _usable(update):
+            # Record the staged output as if generate_explanation had just run
+            print(f"Using speculative explanation for thread: {thread_id}")
+            workflow.update_state(config, update, as_node='generate_explanation')
+            result = workflow.get_state(config).values
+        else:
+            # Continue from where we left off (None means continue with no new input)
+            with request_options(no_cache=no_cache):
+                result = workflow.invoke(None, config=config)
         print(f"Explanation generated for thread: {thread_id}")
         
         return {
@@ -118,6 +228,7 @@ def continue_with_explanation(thread_id: str):
 def get_thread_status(thread_id: str):
     try:
         config = {"configurable": {"thread_id": thread_id}}
+        workflow = get_workflow()
         state = workflow.get_state(config)
         
         if not state or not state.values:
@@ -133,8 +244,111 @@ def get_thread_status(thread_id: str):
             'topic': state.values.get('topic'),
             'has_joke': bool(state.values.get('joke')),
             'has_explanation': bool(state.values.get('explanation')),
-            'next_node': state.next[0] if state.next else None
+            'next_node': state.next[0] if state.next else None,
+            'checkpoint_id': state.config['configurable'].get('checkpoint_id')
         }
     except Exception as e:
         print(f"Error in get_thread_status: {str(e)}")
         raise
+
+
+async def astart_joke_generation(topic: str, thread_id: str, no_cache: bool = False):
+    """Async version of start_joke_generation."""
+    try:
+        config = {"configurable": {"thread_id": thread_id}}
+        workflow = await aget_workflow()
+        print(f"Starting joke generation for topic: {topic}, thread: {thread_id}")
+        
+        initial_state = {
+            'topic': topic,
+            'joke': None,
+            'explanation': None,
+            'status': 'started'
+        }
+        
+        with request_options(no_cache=no_cache):
+            result = await workflow.ainvoke(initial_state, config=config)
+            _aspeculate(thread_id, result)
+        print(f"Joke generation completed for thread: {thread_id}")
+        
+        return {
+            'topic': result.get('topic'),
+            'joke': result.get('joke'),
+            'status': result.get('status', 'joke_generated'),
+            'thread_id': thread_id
+        }
+    except Exception as e:
+        print(f"Error in astart_joke_generation: {str(e)}")
+        raise
+
+
+async def acontinue_with_explanation(thread_id: str, no_cache: bool = False):
+    """Async version of continue_with_explanation."""
+    try:
+        config = {"configurable": {"thread_id": thread_id}}
+        workflow = await aget_workflow()
+        print(f"Continuing workflow for thread: {thread_id}")
+        
+        current_state = await workflow.aget_state(config)
+        
+        if not current_state or not current_state.values:
+            raise ValueError(f"No active workflow found for thread_id: {thread_id}")
+        
+        if not current_state.values.get('joke'):
+            raise ValueError(f"No joke found for thread_id: {thread_id}. Start workflow first.")
+        
+        update = None
+        staged = _take_speculation(thread_id, current_state, no_cache)
+        if staged is not None:
+            try:
+                update = await staged
+            except Exception as e:
+                print(f"Speculative explanation failed for thread {thread_id}: {str(e)}")
+
+        if _usable(update):
+            print(f"Using speculative explanation for thread: {thread_id}")
+            await workflow.aupdate_state(config, update, as_node='generate_explanation')
+            result = (await workflow.aget_state(config)).values
+        else:
+            with request_options(no_cache=no_cache):
+                result = await workflow.ainvoke(None, config=config)
+        print(f"Explanation generated for thread: {thread_id}")
+        
+        return {
+            'topic': result.get('topic'),
+            'joke': result.get('joke'),
+            'explanation': result.get('explanation'),
+            'status': result.get('status', 'completed'),
+            'thread_id': thread_id
+        }
+    except Exception as e:
+        print(f"Error in acontinue_with_explanation: {str(e)}")
+        raise
+
+
+async def aget_thread_status(thread_id: str):
+    """Async version of get_thread_status."""
+    try:
+        config = {"configurable": {"thread_id": thread_id}}
+        workflow = await aget_workflow()
+        state = await workflow.aget_state(config)
+        
+        if not state or not state.values:
+            return {
+                'exists': False,
+                'message': f"No workflow found for thread_id: {thread_id}"
+            }
+        
+        return {
+            'exists': True,
+            'thread_id': thread_id,
+            'status': state.values.get('status', 'unknown'),
+            'topic': state.values.get('topic'),
+            'has_joke': bool(state.values.get('joke')),
+            'has_explanation': bool(state.values.get('explanation')),
+            'next_node': state.next[0] if state.next else None,
+            'checkpoint_id': state.config['configurable'].get('checkpoint_id')
+        }
+    except Exception as e:
+        print(f"Error in aget_thread_status: {str(e)}")
+        raise
@@ -0,0 +1,205 @@
+"""Shared entry point for node LLM calls.
+
+Nodes call complete()/acomplete() with a prompt instead of talking to the
+client directly, so cross-cutting behaviour (response caching, coalescing of
+identical in-flight calls, adaptive concurrency limiting, hedging, circuit
+breaking with a fallback model) lives in one place for both the sync and
+async execution paths.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from .config import get_llm, MODEL_NAME, FALLBACK_MODEL_NAME
+from .cache import get_response_cache, cache_key
+from .singleflight import SingleFlight, LLM_SINGLEFLIGHT_ENABLED
+from .limiter import AdaptiveLimiter, LLM_LIMITER_ENABLED
+from .hedging import Hedger, LLM_HEDGE_ENABLED
+from .breaker import get_breaker, CircuitOpenError
+
+_cache_bypass = contextvars.ContextVar('llm_cache_bypass', default=False)
+_hedge_allowed = contextvars.ContextVar('llm_hedge_allowed', default=True)
+_flights = SingleFlight()
+_limiter = AdaptiveLimiter() if LLM_LIMITER_ENABLED else None
+_hedger = Hedger() if LLM_HEDGE_ENABLED else None
+
+
+@contextmanager
+def request_options(no_cache=False, hedge=True):
+    """Per-request LLM options for every node call made inside the block.
+
+    hedge=False disables duplicate requests, e.g. while tokens are streamed
+    to a client and a second stream would interleave with the first.
+    """
+    cache_token = _cache_bypass.set(no_cache)
+    hedge_token = _hedge_allowed.set(hedge)
+    try:
+        yield
+    finally:
+        _cache_bypass.reset(cache_token)
+        _hedge_allowed.reset(hedge_token)
+
+
+def cache_bypassed():
+    """True when the current request asked to skip every cache."""
+    return _cache_bypass.get()
+
+
+def _active_cache(use_cache):
+    cache = get_response_cache()
+    if cache is None or not use_cache:
+        return None
+    if _cache_bypass.get():
+        cache.record_bypass()
+        return None
+    return cache
+
+
+def _fallback_for(model):
+    if FALLBACK_MODEL_NAME and FALLBACK_MODEL_NAME != model:
+        return FALLBACK_MODEL_NAME
+    return None
+
+
+def _route(model):
+    """The model to call: the fallback while the model's breaker is open."""
+    breaker = get_breaker(model)
+    fallback = _fallback_for(model)
+    if breaker is not None and fallback and breaker.rejecting():
+        return fallback
+    return model
+
+
+def _invoke(model, settings, prompt):
+    # Layers, outermost first: limiter slot -> hedged attempts -> breaker -> client
+    # (a hedge takes a second limiter slot of its own)
+    llm = get_llm(model, **settings)
+    breaker = get_breaker(model)
+
+    def attempt():
+        if breaker is None:
+            return llm.invoke(prompt).content
+        return breaker.call(lambda: llm.invoke(prompt).content)
+
+    def hedge():
+        # The duplicate is upstream load too: only send it if a slot is free now
+        if _limiter is None:
+            return attempt
+        if not _limiter.try_acquire():
+            return None
+        return lambda: _limiter.call_acquired(attempt)
+
+    def call():
+        if _hedger is not None and _hedge_allowed.get():
+            return _hedger.call(attempt, hedge)
+        return attempt()
+
+    if _limiter is None:
+        return call()
+    return _limiter.call(call)
+
+
+async def _ainvoke(model, settings, prompt):
+    llm = get_llm(model, **settings)
+    breaker = get_breaker(model)
+
+    async def invoke():
+        return (await llm.ainvoke(prompt)).content
+
+    async def attempt():
+        if breaker is None:
+            return await invoke()
+        return await breaker.acall(invoke)
+
+    def hedge():
+        if _limiter is None:
+            return attempt
+        if not _limiter.try_acquire():
+            return None
+        return lambda: _limiter.acall_acquired(attempt)
+
+    async def call():
+        if _hedger is not None and _hedge_allowed.get():
+            return await _hedger.acall(attempt, hedge)
+        return await attempt()
+
+    if _limiter is None:
+        return await call()
+    return await _limiter.acall(call)
+
+
+def _complete(model, settings, prompt, use_cache):
+    key = cache_key(model, settings, prompt)
+    cache = _active_cache(use_cache)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    # use_cache=False asks for a fresh sample, so it must not share another call's
+    if LLM_SINGLEFLIGHT_ENABLED and use_cache:
+        text = _flights.do(key, lambda: _invoke(model, settings, prompt))
+    else:
+        text = _invoke(model, settings, prompt)
+
+    if cache is not None and isinstance(text, str):
+        cache.put(key, text)
+    return text
+
+
+async def _acomplete(model, settings, prompt, use_cache):
+    key = cache_key(model, settings, prompt)
+    cache = _active_cache(use_cache)
+    if cache is not None:
+        cached = await cache.aget(key)
+        if cached is not None:
+            return cached
+
+    if LLM_SINGLEFLIGHT_ENABLED and use_cache:
+        text = await _flights.ado(key, lambda: _ainvoke(model, settings, prompt))
+    else:
+        text = await _ainvoke(model, settings, prompt)
+
+    if cache is not None and isinstance(text, str):
+        await cache.aput(key, text)
+    return text
+
+
+def complete(prompt, model=None, use_cache=True, **settings):
+    """Run a prompt through the pooled client and return the response text.
+
+    use_cache=False skips the response cache and request coalescing for
+    callers that need a fresh sample (e.g. filling the joke pool). While the model's circuit breaker is
+    open the call goes to FALLBACK_MODEL_NAME, or fails fast without one.
+    """
+    model = _route(model or MODEL_NAME)
+    try:
+        return _complete(model, settings, prompt, use_cache)
+    except CircuitOpenError:
+        fallback = _fallback_for(model)
+        if fallback is None:
+            raise
+        return _complete(fallback, settings, prompt, use_cache)
+
+
+async def acomplete(prompt, model=None, use_cache=True, **settings):
+    """Async version of complete."""
+    model = _route(model or MODEL_NAME)
+    try:
+        return await _acomplete(model, settings, prompt, use_cache)
+    except CircuitOpenError:
+        fallback = _fallback_for(model)
+        if fallback is None:
+            raise
+        return await _acomplete(fallback, settings, prompt, use_cache)
+
+
+def get_singleflight_stats():
+    return _flights.stats()
+
+
+def get_limiter_stats():
+    return _limiter.stats() if _limiter is not None else {'enabled': False}
+
+
+def get_hedging_stats():
+    return _hedger.stats() if _hedger is not None else {'enabled': False}
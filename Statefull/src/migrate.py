@@ -0,0 +1,38 @@
+"""Create or migrate the checkpoint tables ahead of deployment.
+
+    python -m src.migrate [--sqlite PATH]
+
+Run once per release (e.g. as a release or init step), then start the
+service with CHECKPOINTER_SETUP=false so workers skip the migration queries.
+Uses its own connection, not the service pools.
+"""
+
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or migrate the checkpoint tables.")
+    parser.add_argument('--sqlite', metavar='PATH', help="SqliteSaver database (default: the CHECKPOINTER backend)")
+    args = parser.parse_args(argv)
+
+    from .persistence import CHECKPOINTER, CHECKPOINT_DB_PATH, POSTGRES_DATABASE_URL, check_checkpointer_config
+    sqlite_path = args.sqlite or (CHECKPOINT_DB_PATH if CHECKPOINTER == 'sqlite' else None)
+    if sqlite_path:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        with SqliteSaver.from_conn_string(sqlite_path) as saver:
+            saver.setup()
+        print(f"SQLite checkpoint tables are up to date: {sqlite_path}")
+    elif CHECKPOINTER == 'postgres':
+        check_checkpointer_config('postgres')
+        from langgraph.checkpoint.postgres import PostgresSaver
+        # from_conn_string opens an autocommit connection, which the
+        # CREATE INDEX CONCURRENTLY migrations require
+        with PostgresSaver.from_conn_string(POSTGRES_DATABASE_URL) as saver:
+            saver.setup()
+        print("Postgres checkpoint tables are up to date")
+    else:
+        print(f"Nothing to migrate for the {CHECKPOINTER} checkpointer")
+
+
+if __name__ == "__main__":
+    main()
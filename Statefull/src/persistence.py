@@ -0,0 +1,564 @@
+"""Checkpointer backends (Postgres, SQLite, in-memory) and the Postgres pools.
+
+In async execution mode Postgres goes through AsyncPostgresSaver on an
+AsyncConnectionPool opened in the FastAPI lifespan, so checkpoint I/O
+overlaps with LLM I/O on the event loop instead of taking threadpool slots.
+
+Pool sizing should respect the Supabase pooler limits (see
+TECHNICAL_ANALYSIS.md): max_size summed over every worker and container must
+stay below the connection limit of the pooler mode in use.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from psycopg_pool import AsyncConnectionPool, ConnectionPool, PoolTimeout
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from .config import ASYNC_EXECUTION
+from .state_cache import get_state_cache
+
+POSTGRES_DATABASE_URL = os.getenv("POSTGRES_DATABASE_URL")
+# postgres, sqlite or memory. Local backends must be chosen explicitly so a
+# missing database URL fails at startup instead of writing to a local file
+CHECKPOINTER = os.getenv("CHECKPOINTER", "postgres").lower()
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db")
+# Use the async driver for Postgres when EXECUTION_MODE=async
+POSTGRES_ASYNC = os.getenv("POSTGRES_ASYNC", "true").lower() == "true"
+ASYNC_POSTGRES_CHECKPOINTER = POSTGRES_ASYNC and ASYNC_EXECUTION and CHECKPOINTER == "postgres"
+# Create/migrate the checkpoint tables when the checkpointer is created. Set to
+# false when `python -m src.migrate` runs at deploy time, so workers skip the
+# migration queries at startup and do not race each other on them
+CHECKPOINTER_SETUP = os.getenv("CHECKPOINTER_SETUP", "true").lower() == "true"
+
+# SQLite tuning. WAL + synchronous=NORMAL survives process crashes; a power
+# loss may drop the last few commits
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+# WAL pages before an automatic checkpoint into the main database file
+SQLITE_WAL_AUTOCHECKPOINT = int(os.getenv("SQLITE_WAL_AUTOCHECKPOINT", "1000"))
+
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "20"))
+# Seconds a request may wait for a connection before failing
+POSTGRES_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+# Requests allowed to queue for a connection; 0 means unbounded
+POSTGRES_POOL_MAX_WAITING = int(os.getenv("POSTGRES_POOL_MAX_WAITING", "0"))
+POSTGRES_POOL_MAX_IDLE = float(os.getenv("POSTGRES_POOL_MAX_IDLE", "600"))
+POSTGRES_POOL_MAX_LIFETIME = float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "3600"))
+# Check each connection (SELECT 1 round-trip) before handing it out
+POSTGRES_POOL_CHECK = os.getenv("POSTGRES_POOL_CHECK", "true").lower() == "true"
+# Wait at startup until min_size connections are open; 0 skips the warm-up
+POSTGRES_POOL_WARMUP_TIMEOUT = float(os.getenv("POSTGRES_POOL_WARMUP_TIMEOUT", "30"))
+
+# Transaction-mode poolers do not support prepared statements
+CONNECTION_KWARGS = {
+    "autocommit": True,
+    "prepare_threshold": 0,
+}
+
+# Upper bounds (ms) of the connection wait-time histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class _WaitStatsMixin:
+    """Connection wait-time histogram, timeouts and in-use count for a pool."""
+
+    def _init_wait_stats(self):
+        self._wait_lock = threading.Lock()
+        self._wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._wait_total = 0.0
+        self._timeouts = 0
+        self._in_use = 0
+
+    def _acquired(self, started, conn):
+        self._observe_wait((time.perf_counter() - started) * 1000)
+        with self._wait_lock:
+            self._in_use += 1
+        return conn
+
+    def _timed_out(self, started):
+        self._observe_wait((time.perf_counter() - started) * 1000)
+        with self._wait_lock:
+            self._timeouts += 1
+
+    def _released(self):
+        with self._wait_lock:
+            self._in_use -= 1
+
+    def _observe_wait(self, waited_ms):
+        index = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited_ms <= bound), len(WAIT_BUCKETS_MS))
+        with self._wait_lock:
+            self._wait_counts[index] += 1
+            self._wait_total += waited_ms
+
+    def opened_connections(self):
+        """Connections open right now: idle in the pool plus checked out.
+
+        pool_size is no measure of this: it counts connections still being
+        opened, and is min_size from the moment the pool opens.
+        """
+        with self._wait_lock:
+            in_use = self._in_use
+        return self.get_stats().get('pool_available', 0) + in_use
+
+    def wait_stats(self):
+        with self._wait_lock:
+            counts = list(self._wait_counts)
+            total, timeouts, in_use = self._wait_total, self._timeouts, self._in_use
+        requests = sum(counts)
+        labels = [f"le_{bound}ms" for bound in WAIT_BUCKETS_MS] + [f"gt_{WAIT_BUCKETS_MS[-1]}ms"]
+        return {
+            'in_use': in_use,
+            'requests': requests,
+            'timeouts': timeouts,
+            'wait_avg_ms': round(total / requests, 3) if requests else 0.0,
+            'wait_histogram': dict(zip(labels, counts)),
+        }
+
+
+class InstrumentedConnectionPool(_WaitStatsMixin, ConnectionPool):
+    """ConnectionPool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        self._init_wait_stats()
+        super().__init__(*args, **kwargs)
+
+    def getconn(self, timeout=None):
+        started = time.perf_counter()
+        try:
+            conn = super().getconn(timeout=timeout)
+        except PoolTimeout:
+            self._timed_out(started)
+            raise
+        return self._acquired(started, conn)
+
+    def putconn(self, conn):
+        self._released()
+        super().putconn(conn)
+
+    def warm_up(self, timeout):
+        """Wait until min_size connections are open; False on timeout.
+
+        Connections checked out by requests count, so a busy pool is ready.
+        Unlike wait(), a timeout leaves the pool open so it keeps retrying.
+        """
+        deadline = time.monotonic() + timeout
+        while self.opened_connections() < self.min_size:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+class InstrumentedAsyncConnectionPool(_WaitStatsMixin, AsyncConnectionPool):
+    """Async version of InstrumentedConnectionPool."""
+
+    def __init__(self, *args, **kwargs):
+        self._init_wait_stats()
+        super().__init__(*args, **kwargs)
+
+    async def getconn(self, timeout=None):
+        started = time.perf_counter()
+        try:
+            conn = await super().getconn(timeout=timeout)
+        except PoolTimeout:
+            self._timed_out(started)
+            raise
+        return self._acquired(started, conn)
+
+    async def putconn(self, conn):
+        self._released()
+        await super().putconn(conn)
+
+    async def warm_up(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self.opened_connections() < self.min_size:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+
+class ThreadedAsyncMixin:
+    """Async saver methods that run the sync queries in a worker thread.
+
+    Lets workflow.ainvoke/aget_state drive a sync saver so the LLM calls in
+    the async nodes do not block the event loop.
+    """
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+class _StateCacheBase:
+    @staticmethod
+    def _latest_thread(config):
+        configurable = config.get('configurable', {})
+        if configurable.get('checkpoint_id') or configurable.get('checkpoint_ns', ''):
+            return None
+        return str(configurable['thread_id'])
+
+    def _invalidate(self, thread_id):
+        cache = get_state_cache()
+        if cache is not None:
+            cache.invalidate(str(thread_id))
+
+
+class StateCacheMixin(_StateCacheBase):
+    """Serves reads of a thread's latest checkpoint from the state cache.
+
+    Reads of a specific checkpoint_id or a subgraph namespace go to the
+    database; every put, put_writes and delete_thread invalidates the thread.
+    """
+
+    def get_tuple(self, config):
+        cache = get_state_cache()
+        thread_id = self._latest_thread(config) if cache is not None else None
+        if thread_id is None:
+            return super().get_tuple(config)
+        cached = cache.get(thread_id)
+        if cached is not None:
+            return cached
+        started = cache.begin()
+        result = super().get_tuple(config)
+        cache.store(thread_id, result, started)
+        return result
+
+    async def aget_tuple(self, config):
+        # Answer hits on the event loop instead of hopping to a worker thread
+        cache = get_state_cache()
+        thread_id = self._latest_thread(config) if cache is not None else None
+        if thread_id is None:
+            return await super().aget_tuple(config)
+        cached = cache.get(thread_id)
+        if cached is not None:
+            return cached
+        started = cache.begin()
+        # The uncached read, in a worker thread like ThreadedAsyncMixin
+        result = await asyncio.to_thread(super().get_tuple, config)
+        cache.store(thread_id, result, started)
+        return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config['configurable']['thread_id']
+        self._invalidate(thread_id)
+        try:
+            return super().put(config, checkpoint, metadata, new_versions)
+        finally:
+            # Again after the commit, so a read racing the write is not cached
+            self._invalidate(thread_id)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config['configurable']['thread_id']
+        self._invalidate(thread_id)
+        try:
+            return super().put_writes(config, writes, task_id, task_path)
+        finally:
+            self._invalidate(thread_id)
+
+    def delete_thread(self, thread_id):
+        self._invalidate(thread_id)
+        try:
+            return super().delete_thread(thread_id)
+        finally:
+            self._invalidate(thread_id)
+
+
+class AsyncStateCacheMixin(_StateCacheBase):
+    """StateCacheMixin for natively async savers."""
+
+    async def aget_tuple(self, config):
+        cache = get_state_cache()
+        thread_id = self._latest_thread(config) if cache is not None else None
+        if thread_id is None:
+            return await super().aget_tuple(config)
+        cached = cache.get(thread_id)
+        if cached is not None:
+            return cached
+        started = cache.begin()
+        result = await super().aget_tuple(config)
+        cache.store(thread_id, result, started)
+        return result
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        thread_id = config['configurable']['thread_id']
+        self._invalidate(thread_id)
+        try:
+            return await super().aput(config, checkpoint, metadata, new_versions)
+        finally:
+            self._invalidate(thread_id)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config['configurable']['thread_id']
+        self._invalidate(thread_id)
+        try:
+            return await super().aput_writes(config, writes, task_id, task_path)
+        finally:
+            self._invalidate(thread_id)
+
+    async def adelete_thread(self, thread_id):
+        self._invalidate(thread_id)
+        try:
+            return await super().adelete_thread(thread_id)
+        finally:
+            self._invalidate(thread_id)
+
+
+class CachedAsyncPostgresSaver(AsyncStateCacheMixin, AsyncPostgresSaver):
+    """AsyncPostgresSaver on the lifespan-managed async pool."""
+
+
+class ThreadedPostgresSaver(StateCacheMixin, ThreadedAsyncMixin, PostgresSaver):
+    """PostgresSaver on the shared sync pool, usable from async code."""
+
+
+class ThreadLocalSqliteSaver(StateCacheMixin, ThreadedAsyncMixin, SqliteSaver):
+    """SqliteSaver with one connection per thread instead of one locked connection.
+
+    In WAL mode readers never block the writer, so request threads (and the
+    async bridge's worker threads) only contend on actual writes, which wait
+    up to SQLITE_BUSY_TIMEOUT_MS for the write lock.
+    """
+
+    def __init__(self, path, *, serde=None):
+        self.path = path
+        self._local = threading.local()
+        super().__init__(self._connect(), serde=serde)
+
+    @property
+    def conn(self):
+        return self._connect()
+
+    @conn.setter
+    def conn(self, value):
+        # SqliteSaver.__init__ assigns the first connection; it is already cached
+        pass
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_MB * 1024}")
+            conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute(f"PRAGMA wal_autocheckpoint={SQLITE_WAL_AUTOCHECKPOINT}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def cursor(self, transaction=True):
+        # Same as SqliteSaver.cursor without the process-wide lock
+        self.setup()
+        conn = self.conn
+        cur = conn.cursor()
+        try:
+            yield cur
+        finally:
+            if transaction:
+                conn.commit()
+            cur.close()
+
+
+_pool = None
+_async_pool = None
+_backend = None
+
+
+def check_checkpointer_config(backend=None):
+    """Raise ValueError for a backend that cannot work, before anything is opened."""
+    backend = (backend or CHECKPOINTER).lower()
+    if backend not in ('postgres', 'sqlite', 'memory'):
+        raise ValueError(f"Unknown CHECKPOINTER backend: {backend} (expected postgres, sqlite or memory)")
+    if backend == 'postgres' and not POSTGRES_DATABASE_URL:
+        raise ValueError("POSTGRES_DATABASE_URL is required for the postgres checkpointer "
+                         "(set CHECKPOINTER=sqlite or CHECKPOINTER=memory to run without it)")
+    return backend
+
+
+def create_checkpointer(backend=None, sqlite_path=None, setup=None):
+    """Checkpointer for the selected backend, with its tables created unless setup
+    (default CHECKPOINTER_SETUP) is off."""
+    global _backend
+    backend = check_checkpointer_config(backend)
+    setup = CHECKPOINTER_SETUP if setup is None else setup
+    if backend == 'postgres':
+        # PostgresSaver requires a psycopg3 connection pool (sized via POSTGRES_POOL_* env)
+        pool = create_pool()
+        checkpointer = ThreadedPostgresSaver(pool)
+        if setup:
+            try:
+                checkpointer.setup()
+            except Exception:
+                # Do not leak the pool when startup is retried
+                _close_pool(pool)
+                raise
+    elif backend == 'sqlite':
+        checkpointer = ThreadLocalSqliteSaver(sqlite_path or CHECKPOINT_DB_PATH)
+        if setup:
+            checkpointer.setup()
+        else:
+            # SqliteSaver.cursor() would otherwise run setup on first use
+            checkpointer.is_setup = True
+    elif backend == 'memory':
+        # Lost on restart and not shared between workers; for tests and single-box demos
+        checkpointer = InMemorySaver()
+    _backend = backend
+    print(f"{backend} checkpointer initialized", checkpointer)
+    return checkpointer
+
+
+async def acreate_checkpointer():
+    """Async Postgres checkpointer; call from the running event loop (FastAPI lifespan)."""
+    global _backend
+    check_checkpointer_config('postgres')
+    checkpointer = CachedAsyncPostgresSaver(await acreate_pool())
+    if CHECKPOINTER_SETUP:
+        try:
+            await checkpointer.setup()
+        except Exception:
+            await aclose_checkpointer()
+            raise
+    _backend = 'postgres'
+    print("postgres (async) checkpointer initialized", checkpointer)
+    return checkpointer
+
+
+async def aclose_checkpointer():
+    """Close the async pool, waiting for connections in use to be returned."""
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+        print("Async Postgres pool closed")
+
+
+def _close_pool(pool):
+    global _pool
+    pool.close()
+    if _pool is pool:
+        _pool = None
+
+
+def get_checkpointer_backend():
+    return _backend
+
+
+def create_pool():
+    """Open the checkpointer pool and warm it up to min_size."""
+    global _pool
+    pool = InstrumentedConnectionPool(
+        conninfo=POSTGRES_DATABASE_URL,
+        min_size=POSTGRES_POOL_MIN_SIZE,
+        max_size=POSTGRES_POOL_MAX_SIZE,
+        timeout=POSTGRES_POOL_TIMEOUT,
+        max_waiting=POSTGRES_POOL_MAX_WAITING,
+        max_idle=POSTGRES_POOL_MAX_IDLE,
+        max_lifetime=POSTGRES_POOL_MAX_LIFETIME,
+        check=ConnectionPool.check_connection if POSTGRES_POOL_CHECK else None,
+        kwargs=CONNECTION_KWARGS,
+        name="checkpointer",
+        open=True,
+    )
+    if POSTGRES_POOL_WARMUP_TIMEOUT:
+        if pool.warm_up(POSTGRES_POOL_WARMUP_TIMEOUT):
+            print(f"Postgres pool warmed up ({POSTGRES_POOL_MIN_SIZE} connections)")
+        else:
+            # Keep starting; connections are retried in the background
+            print(f"Postgres pool did not reach {POSTGRES_POOL_MIN_SIZE} connections "
+                  f"within {POSTGRES_POOL_WARMUP_TIMEOUT}s")
+    _pool = pool
+    return pool
+
+
+async def acreate_pool():
+    """Open the async checkpointer pool and warm it up to min_size."""
+    global _async_pool
+    pool = InstrumentedAsyncConnectionPool(
+        conninfo=POSTGRES_DATABASE_URL,
+        min_size=POSTGRES_POOL_MIN_SIZE,
+        max_size=POSTGRES_POOL_MAX_SIZE,
+        timeout=POSTGRES_POOL_TIMEOUT,
+        max_waiting=POSTGRES_POOL_MAX_WAITING,
+        max_idle=POSTGRES_POOL_MAX_IDLE,
+        max_lifetime=POSTGRES_POOL_MAX_LIFETIME,
+        check=AsyncConnectionPool.check_connection if POSTGRES_POOL_CHECK else None,
+        kwargs=CONNECTION_KWARGS,
+        name="checkpointer-async",
+        open=False,
+    )
+    await pool.open()
+    if POSTGRES_POOL_WARMUP_TIMEOUT:
+        if await pool.warm_up(POSTGRES_POOL_WARMUP_TIMEOUT):
+            print(f"Async Postgres pool warmed up ({POSTGRES_POOL_MIN_SIZE} connections)")
+        else:
+            print(f"Async Postgres pool did not reach {POSTGRES_POOL_MIN_SIZE} connections "
+                  f"within {POSTGRES_POOL_WARMUP_TIMEOUT}s")
+    _async_pool = pool
+    return pool
+
+
+def get_pool():
+    return _pool or _async_pool
+
+
+async def await_pool_min_size(timeout):
+    """Wait until the checkpointer pool has min_size connections open.
+
+    True once it has (or when there is no pool), False on timeout.
+    """
+    pool = get_pool()
+    if pool is None:
+        return True
+    if pool is _async_pool:
+        return await pool.warm_up(timeout)
+    return await asyncio.to_thread(pool.warm_up, timeout)
+
+
+def get_pool_stats():
+    """Pool configuration, current usage and wait-time histogram."""
+    pool = get_pool()
+    if pool is None:
+        return {'enabled': False}
+    stats = pool.get_stats()
+    return {
+        'enabled': True,
+        'driver': 'async' if pool is _async_pool else 'sync',
+        'min_size': pool.min_size,
+        'max_size': pool.max_size,
+        'timeout_s': pool.timeout,
+        'size': stats.get('pool_size', 0),
+        'available': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connection_errors': stats.get('connections_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+        'returns_bad': stats.get('returns_bad', 0),
+        **pool.wait_stats(),
+    }
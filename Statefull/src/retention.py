@@ -0,0 +1,376 @@
+"""Retention and compaction of checkpoint tables.
+
+The checkpointer keeps every checkpoint and write of every thread forever.
+A retention run walks the threads in small batches and:
+
+- deletes completed threads whose last checkpoint is older than
+  RETENTION_COMPLETED_TTL, and unfinished (abandoned) threads older than
+  RETENTION_ABANDONED_TTL;
+- compacts younger completed threads down to their latest checkpoint.
+
+Each batch is one short transaction with a lock timeout, so a run backs off
+instead of queueing behind (and blocking) request traffic. Works against
+PostgresSaver and SqliteSaver tables.
+
+    python -m src.retention [--dry-run] [--sqlite checkpoints.db]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from .state_cache import get_state_cache
+
+# Seconds after the last checkpoint before a thread is deleted; 0 keeps forever
+RETENTION_COMPLETED_TTL = float(os.getenv("RETENTION_COMPLETED_TTL", "604800"))
+RETENTION_ABANDONED_TTL = float(os.getenv("RETENTION_ABANDONED_TTL", "86400"))
+# Drop all but the latest checkpoint of completed threads
+RETENTION_KEEP_LATEST_ONLY = os.getenv("RETENTION_KEEP_LATEST_ONLY", "true").lower() == "true"
+# Threads per transaction, and the pause between transactions (seconds)
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.1"))
+# Give up on a batch instead of waiting this long (ms) for a row lock
+RETENTION_LOCK_TIMEOUT_MS = int(os.getenv("RETENTION_LOCK_TIMEOUT_MS", "2000"))
+# POST /admin/retention is disabled unless this token is set (sent as X-Admin-Token)
+RETENTION_ADMIN_TOKEN = os.getenv("RETENTION_ADMIN_TOKEN")
+
+# 100ns intervals between the UUID (1582-10-15) and Unix epochs
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def checkpoint_time(checkpoint_id):
+    """Unix time encoded in a (uuid6) checkpoint id, or None."""
+    try:
+        value = uuid.UUID(checkpoint_id)
+    except (ValueError, TypeError):
+        return None
+    if value.version != 6:
+        return None
+    i = value.int
+    ticks = ((i >> 96) << 28) | (((i >> 80) & 0xFFFF) << 12) | ((i >> 64) & 0xFFF)
+    return (ticks - _UUID_EPOCH_OFFSET) / 1e7
+
+
+def is_completed(values):
+    """generate_explanation is the last node and always writes explanation."""
+    return values.get('explanation') is not None
+
+
+class RetentionInProgress(Exception):
+    """Raised when a retention run is started while another one is running."""
+
+
+class _Rollback(Exception):
+    """Raised inside a batch transaction to undo it (dry runs)."""
+
+
+class PostgresRetentionStore:
+    """Batched deletes over the PostgresSaver tables."""
+
+    tables = ('checkpoints', 'checkpoint_writes', 'checkpoint_blobs')
+
+    def __init__(self, saver, lock_timeout_ms=RETENTION_LOCK_TIMEOUT_MS):
+        self.saver = saver
+        self.lock_timeout_ms = lock_timeout_ms
+
+    def _connection(self):
+        from langgraph.checkpoint.postgres._internal import get_connection
+        return get_connection(self.saver.conn)
+
+    def threads(self, after, limit):
+        """(thread_id, latest checkpoint_id, checkpoint count) after a thread_id."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT thread_id, max(checkpoint_id), count(*) FROM checkpoints "
+                "WHERE checkpoint_ns = '' AND thread_id > %s "
+                "GROUP BY thread_id ORDER BY thread_id LIMIT %s",
+                (after, limit),
+            ).fetchall()
+        return [_row(r) for r in rows]
+
+    def run_batch(self, deletes, compactions, dry_run=False):
+        """Delete whole threads and compact others in one short transaction.
+
+        deletes and compactions map thread_id -> latest checkpoint_id as seen
+        when the thread was classified; threads that moved on since are left
+        alone. Returns ({table: [rows, bytes]}, deleted ids, compacted ids),
+        or None when the batch was skipped.
+        """
+        import psycopg
+        reclaimed = {table: [0, 0] for table in self.tables}
+        compacted = []
+        with self._connection() as conn:
+            try:
+                with conn.transaction():
+                    conn.execute(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}")
+                    ids = list(deletes) + list(compactions)
+                    latest = dict(_row(r)[:2] for r in conn.execute(
+                        "SELECT thread_id, max(checkpoint_id) FROM checkpoints "
+                        "WHERE checkpoint_ns = '' AND thread_id = ANY(%s::text[]) GROUP BY thread_id",
+                        (ids,),
+                    ).fetchall())
+                    expired = [t for t, c in deletes.items() if latest.get(t) == c]
+                    for table in self.tables:
+                        self._count(reclaimed[table], conn.execute(
+                            f"WITH d AS (DELETE FROM {table} t WHERE thread_id = ANY(%s::text[]) "
+                            "RETURNING pg_column_size(t.*) AS size) "
+                            "SELECT count(*), coalesce(sum(size), 0) FROM d",
+                            (expired,),
+                        ))
+                    for thread_id, keep in compactions.items():
+                        if latest.get(thread_id) != keep:
+                            continue
+                        self._compact(conn, thread_id, keep, reclaimed)
+                        compacted.append(thread_id)
+                    if dry_run:
+                        raise _Rollback()
+            except _Rollback:
+                pass
+            except psycopg.errors.LockNotAvailable:
+                print("Retention batch skipped: checkpoint rows are locked")
+                return None
+        return reclaimed, expired, compacted
+
+    def _compact(self, conn, thread_id, keep, reclaimed):
+        for table in ('checkpoint_writes', 'checkpoints'):
+            self._count(reclaimed[table], conn.execute(
+                f"WITH d AS (DELETE FROM {table} t WHERE thread_id = %s AND checkpoint_ns = '' "
+                "AND checkpoint_id < %s RETURNING pg_column_size(t.*) AS size) "
+                "SELECT count(*), coalesce(sum(size), 0) FROM d",
+                (thread_id, keep),
+            ))
+        # Only blob versions older than the one the kept checkpoint references;
+        # newer ones may belong to a checkpoint being written right now
+        self._count(reclaimed['checkpoint_blobs'], conn.execute(
+            "WITH kept AS (SELECT v.key AS channel, v.value AS version FROM checkpoints c, "
+            "jsonb_each_text(c.checkpoint -> 'channel_versions') v "
+            "WHERE c.thread_id = %s AND c.checkpoint_ns = '' AND c.checkpoint_id = %s), "
+            "d AS (DELETE FROM checkpoint_blobs t USING kept "
+            "WHERE t.thread_id = %s AND t.checkpoint_ns = '' "
+            "AND t.channel = kept.channel AND t.version < kept.version "
+            "RETURNING pg_column_size(t.*) AS size) "
+            "SELECT count(*), coalesce(sum(size), 0) FROM d",
+            (thread_id, keep, thread_id),
+        ))
+
+    @staticmethod
+    def _count(totals, cursor):
+        rows, size = _row(cursor.fetchone())
+        totals[0] += rows
+        totals[1] += int(size)
+
+
+class SqliteRetentionStore:
+    """Batched deletes over the SqliteSaver tables."""
+
+    tables = ('checkpoints', 'writes')
+    # Approximate row size: keys plus serialized payload
+    _row_size = {
+        'checkpoints': "length(thread_id) + length(checkpoint_ns) + length(checkpoint_id) "
+                       "+ coalesce(length(checkpoint), 0) + coalesce(length(metadata), 0)",
+        'writes': "length(thread_id) + length(checkpoint_ns) + length(checkpoint_id) "
+                  "+ length(task_id) + length(channel) + coalesce(length(value), 0)",
+    }
+
+    def __init__(self, saver, lock_timeout_ms=RETENTION_LOCK_TIMEOUT_MS):
+        self.saver = saver
+        self.conn = saver.conn
+        self.lock_timeout_ms = lock_timeout_ms
+
+    def threads(self, after, limit):
+        with self.saver.lock:
+            return self.conn.execute(
+                "SELECT thread_id, max(checkpoint_id), count(*) FROM checkpoints "
+                "WHERE checkpoint_ns = '' AND thread_id > ? "
+                "GROUP BY thread_id ORDER BY thread_id LIMIT ?",
+                (after, limit),
+            ).fetchall()
+
+    def run_batch(self, deletes, compactions, dry_run=False):
+        reclaimed = {table: [0, 0] for table in self.tables}
+        deleted, compacted = [], []
+        with self.saver.lock:
+            cur = self.conn.cursor()
+            cur.execute(f"PRAGMA busy_timeout = {int(self.lock_timeout_ms)}")
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                print("Retention batch skipped: database is locked")
+                return None
+            try:
+                for thread_id, seen in {**deletes, **compactions}.items():
+                    latest = cur.execute(
+                        "SELECT max(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+                        (thread_id,),
+                    ).fetchone()[0]
+                    if latest != seen:
+                        continue
+                    if thread_id in deletes:
+                        where, params = "thread_id = ?", (thread_id,)
+                        deleted.append(thread_id)
+                    else:
+                        where, params = "thread_id = ? AND checkpoint_ns = '' AND checkpoint_id < ?", (thread_id, seen)
+                        compacted.append(thread_id)
+                    for table in self.tables:
+                        rows, size = cur.execute(
+                            f"SELECT count(*), coalesce(sum({self._row_size[table]}), 0) FROM {table} WHERE {where}",
+                            params,
+                        ).fetchone()
+                        cur.execute(f"DELETE FROM {table} WHERE {where}", params)
+                        reclaimed[table][0] += rows
+                        reclaimed[table][1] += size
+                cur.execute("ROLLBACK" if dry_run else "COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return reclaimed, deleted, compacted
+
+
+def _row(row):
+    # psycopg pools in this service use dict rows
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def store_for(saver):
+    """Retention store for a PostgresSaver or SqliteSaver instance."""
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    if isinstance(saver, SqliteSaver):
+        return SqliteRetentionStore(saver)
+    if isinstance(saver, PostgresSaver):
+        return PostgresRetentionStore(saver)
+    raise ValueError(f"Retention is not supported for {type(saver).__name__}")
+
+
+_run_lock = threading.Lock()
+_last_report = None
+
+
+def run_retention(saver, **options):
+    """Apply the retention policy to every thread; returns a report of what was reclaimed."""
+    global _last_report
+    if not _run_lock.acquire(blocking=False):
+        raise RetentionInProgress("A retention run is already in progress")
+    try:
+        report = _run(saver, **options)
+    finally:
+        _run_lock.release()
+    _last_report = report
+    return report
+
+
+def get_retention_stats():
+    """Policy and the report of the last run in this process."""
+    return {
+        'completed_ttl_s': RETENTION_COMPLETED_TTL,
+        'abandoned_ttl_s': RETENTION_ABANDONED_TTL,
+        'keep_latest_only': RETENTION_KEEP_LATEST_ONLY,
+        'running': _run_lock.locked(),
+        'last_run': _last_report,
+    }
+
+
+def _run(saver, *, completed_ttl=RETENTION_COMPLETED_TTL, abandoned_ttl=RETENTION_ABANDONED_TTL,
+         keep_latest_only=RETENTION_KEEP_LATEST_ONLY, batch_size=RETENTION_BATCH_SIZE,
+         batch_pause=RETENTION_BATCH_PAUSE, dry_run=False, now=None):
+    store = store_for(saver)
+    cache = get_state_cache()
+    now = time.time() if now is None else now
+    started = time.perf_counter()
+    report = {
+        'dry_run': dry_run,
+        'threads_scanned': 0,
+        'threads_deleted': {'completed': 0, 'abandoned': 0},
+        'threads_compacted': 0,
+        'batches_skipped': 0,
+        'rows_deleted': {table: 0 for table in store.tables},
+        'bytes_reclaimed': {table: 0 for table in store.tables},
+    }
+
+    after = ''
+    while True:
+        threads = store.threads(after, batch_size)
+        if not threads:
+            break
+        after = threads[-1][0]
+        report['threads_scanned'] += len(threads)
+
+        deletes, compactions, kinds = {}, {}, {}
+        for thread_id, latest, count in threads:
+            created = checkpoint_time(latest)
+            age = now - created if created is not None else 0.0
+            expiring = any(ttl and age >= ttl for ttl in (completed_ttl, abandoned_ttl))
+            if not expiring and not (keep_latest_only and count > 1):
+                continue
+            checkpoint = saver.get_tuple({'configurable': {
+                'thread_id': thread_id, 'checkpoint_ns': '', 'checkpoint_id': latest}})
+            if checkpoint is None:
+                continue
+            completed = is_completed(checkpoint.checkpoint.get('channel_values', {}))
+            ttl = completed_ttl if completed else abandoned_ttl
+            if ttl and age >= ttl:
+                deletes[thread_id] = latest
+                kinds[thread_id] = 'completed' if completed else 'abandoned'
+            elif completed and keep_latest_only and count > 1:
+                compactions[thread_id] = latest
+
+        if deletes or compactions:
+            result = store.run_batch(deletes, compactions, dry_run=dry_run)
+            if result is None:
+                report['batches_skipped'] += 1
+            else:
+                # Threads written to since they were classified were left alone
+                reclaimed, deleted, compacted = result
+                for table, (rows, size) in reclaimed.items():
+                    report['rows_deleted'][table] += rows
+                    report['bytes_reclaimed'][table] += size
+                for thread_id in deleted:
+                    report['threads_deleted'][kinds[thread_id]] += 1
+                if cache is not None and not dry_run:
+                    for thread_id in deleted:
+                        cache.invalidate(thread_id)
+                report['threads_compacted'] += len(compacted)
+            if batch_pause:
+                time.sleep(batch_pause)
+
+    report['rows_deleted']['total'] = sum(report['rows_deleted'].values())
+    report['bytes_reclaimed']['total'] = sum(report['bytes_reclaimed'].values())
+    report['duration_s'] = round(time.perf_counter() - started, 3)
+    report['finished_at'] = datetime.now().isoformat()
+    print(f"Retention {'dry run' if dry_run else 'run'} finished: "
+          f"{report['rows_deleted']['total']} rows, {report['bytes_reclaimed']['total']} bytes "
+          f"from {report['threads_scanned']} threads")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete expired threads and compact checkpoint tables.")
+    parser.add_argument('--dry-run', action='store_true', help="report what would be reclaimed, delete nothing")
+    parser.add_argument('--sqlite', metavar='PATH', help="SqliteSaver database (default: the CHECKPOINTER backend)")
+    parser.add_argument('--completed-ttl', type=float, default=RETENTION_COMPLETED_TTL)
+    parser.add_argument('--abandoned-ttl', type=float, default=RETENTION_ABANDONED_TTL)
+    parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    options = dict(completed_ttl=args.completed_ttl, abandoned_ttl=args.abandoned_ttl,
+                   batch_size=args.batch_size, dry_run=args.dry_run)
+    from .persistence import CHECKPOINTER, CHECKPOINT_DB_PATH, POSTGRES_DATABASE_URL, check_checkpointer_config
+    sqlite_path = args.sqlite or (CHECKPOINT_DB_PATH if CHECKPOINTER == 'sqlite' else None)
+    if sqlite_path:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+        with SqliteSaver.from_conn_string(sqlite_path) as saver:
+            report = run_retention(saver, **options)
+    else:
+        check_checkpointer_config('postgres')
+        from langgraph.checkpoint.postgres import PostgresSaver
+        with PostgresSaver.from_conn_string(POSTGRES_DATABASE_URL) as saver:
+            report = run_retention(saver, **options)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Coalesce concurrent identical calls into one upstream request.
+
+The first caller for a key (the leader) runs the call; callers arriving
+while it is in flight wait for and share its result or exception.
+"""
+
+import asyncio
+import os
+import threading
+
+LLM_SINGLEFLIGHT_ENABLED = os.getenv("LLM_SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Per-key call coalescing for threads (do) and event loops (ado)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._stats = {'leaders': 0, 'collapsed': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+            else:
+                call.waiters += 1
+                self._stats['collapsed'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key, coro_fn):
+        # Tasks belong to one event loop, so coalesce per loop
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = asyncio.ensure_future(coro_fn())
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda _: self._forget(task_key))
+                self._stats['leaders'] += 1
+            else:
+                self._stats['collapsed'] += 1
+
+        # Shield so one cancelled caller does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self):
+        with self._lock:
+            leaders, collapsed = self._stats['leaders'], self._stats['collapsed']
+            return {
+                'enabled': LLM_SINGLEFLIGHT_ENABLED,
+                'upstream_calls': leaders,
+                'collapsed': collapsed,
+                'collapse_ratio': round(collapsed / (leaders + collapsed), 4) if leaders + collapsed else 0.0,
+                'in_flight': len(self._calls) + len(self._tasks),
+            }
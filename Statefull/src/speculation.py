@@ -0,0 +1,117 @@
+"""Speculative precomputation of the explanation right after /start.
+
+While the client reads the joke, the explanation node runs in the background
+and its output is staged per thread. /continue takes the staged result (or
+joins it if still running) instead of calling the model again. Results for
+threads that never continue expire after a TTL.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SPECULATIVE_EXPLANATION = os.getenv("SPECULATIVE_EXPLANATION", "false").lower() == "true"
+SPECULATION_TTL = float(os.getenv("SPECULATION_TTL", "300"))
+SPECULATION_MAX_ENTRIES = int(os.getenv("SPECULATION_MAX_ENTRIES", "10000"))
+# Threads running speculative nodes in sync execution mode
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "8"))
+
+
+class Speculator:
+    """Staged background node results keyed by thread_id."""
+
+    def __init__(self, ttl=SPECULATION_TTL, max_entries=SPECULATION_MAX_ENTRIES, workers=SPECULATION_WORKERS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.workers = workers
+        self._entries = OrderedDict()  # thread_id -> (key, future or task, started_at)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {'started': 0, 'hits': 0, 'joined': 0, 'misses': 0, 'expired': 0, 'discarded': 0}
+
+    def _drop(self, entry, reason):
+        _, future, _ = entry
+        # A running thread cannot be interrupted; its result is simply never read
+        future.cancel()
+        self._stats[reason] += 1
+
+    def _stage(self, thread_id, key, future):
+        now = time.monotonic()
+        with self._lock:
+            old = self._entries.pop(thread_id, None)
+            if old is not None:
+                self._drop(old, 'discarded')
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if now - oldest[2] < self.ttl and len(self._entries) < self.max_entries:
+                    break
+                self._drop(self._entries.popitem(last=False)[1], 'expired')
+            self._entries[thread_id] = (key, future, now)
+            self._stats['started'] += 1
+
+    def submit(self, thread_id, key, fn, *args):
+        """Run fn(*args) in a worker thread and stage its result under thread_id.
+
+        key identifies the input the result belongs to (e.g. the joke), so a
+        thread restarted with a new joke never receives a stale result.
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="speculation")
+        context = contextvars.copy_context()
+        self._stage(thread_id, key, self._executor.submit(context.run, fn, *args))
+
+    def asubmit(self, thread_id, key, coro):
+        """Async version of submit: run coro as a task on the running loop."""
+        self._stage(thread_id, key, asyncio.ensure_future(coro))
+
+    def take(self, thread_id, key):
+        """Remove and return the staged future for thread_id, or None."""
+        with self._lock:
+            entry = self._entries.pop(thread_id, None)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            staged_key, future, started_at = entry
+            if staged_key != key:
+                self._drop(entry, 'discarded')
+                self._stats['misses'] += 1
+                return None
+            if time.monotonic() - started_at >= self.ttl:
+                self._drop(entry, 'expired')
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits' if future.done() else 'joined'] += 1
+            return future
+
+    def discard(self, thread_id):
+        with self._lock:
+            entry = self._entries.pop(thread_id, None)
+            if entry is not None:
+                self._drop(entry, 'discarded')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': True,
+                'staged': len(self._entries),
+                'ttl_s': self.ttl,
+                **self._stats,
+            }
+
+
+_speculator = Speculator() if SPECULATIVE_EXPLANATION else None
+
+
+def get_speculator():
+    """Process-wide speculator, or None when SPECULATIVE_EXPLANATION is off."""
+    return _speculator
+
+
+def get_speculation_stats():
+    return _speculator.stats() if _speculator is not None else {'enabled': False}
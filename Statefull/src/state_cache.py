@@ -0,0 +1,129 @@
+"""In-process cache of the latest checkpoint of each thread.
+
+Reads of a thread's latest checkpoint (get_state for /status and /continue,
+and the resume inside invoke) are served from memory instead of a database
+round-trip plus deserialization. Every checkpoint or write put for a thread
+invalidates its entry; the next read repopulates it.
+
+Only writes made by this process invalidate entries. With several workers,
+route each thread to one worker or keep STATE_CACHE_TTL short.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from langgraph.checkpoint.base import copy_checkpoint
+
+STATE_CACHE_ENABLED = os.getenv("STATE_CACHE_ENABLED", "false").lower() == "true"
+STATE_CACHE_MAX_ENTRIES = int(os.getenv("STATE_CACHE_MAX_ENTRIES", "10000"))
+# Seconds an entry is served without re-reading the database
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "60"))
+
+
+def copy_tuple(checkpoint_tuple):
+    """Copy of a CheckpointTuple that the graph loop can mutate safely."""
+    return checkpoint_tuple._replace(
+        checkpoint=copy_checkpoint(checkpoint_tuple.checkpoint),
+        metadata=dict(checkpoint_tuple.metadata),
+        pending_writes=list(checkpoint_tuple.pending_writes) if checkpoint_tuple.pending_writes is not None else None,
+    )
+
+
+class StateCache:
+    """LRU of latest CheckpointTuples keyed by thread_id, with write invalidation."""
+
+    def __init__(self, max_entries=STATE_CACHE_MAX_ENTRIES, ttl=STATE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()      # thread_id -> (CheckpointTuple, stored_at)
+        self._invalidated = OrderedDict()  # thread_id -> clock value of its last write
+        self._clock = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'stale_rejected': 0,
+                       'expired': 0, 'evictions': 0}
+
+    def begin(self):
+        """Mark the start of a database read; pass the result to store()."""
+        with self._lock:
+            return self._clock
+
+    def get(self, thread_id):
+        """Copy of the cached latest checkpoint for thread_id, or None."""
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            checkpoint_tuple, stored_at = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[thread_id]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(thread_id)
+            self._stats['hits'] += 1
+        return copy_tuple(checkpoint_tuple)
+
+    def store(self, thread_id, checkpoint_tuple, started):
+        """Cache a tuple read from the database, unless the thread was written since started."""
+        if checkpoint_tuple is None:
+            return
+        snapshot = copy_tuple(checkpoint_tuple)
+        with self._lock:
+            last_write = self._invalidated.get(thread_id)
+            if last_write is None and len(self._invalidated) >= self.max_entries:
+                # This thread's write history may have been evicted; only trust
+                # reads that started after the oldest remembered write
+                last_write = next(iter(self._invalidated.values()))
+            if last_write is not None and last_write > started:
+                self._stats['stale_rejected'] += 1
+                return
+            self._entries[thread_id] = (snapshot, time.monotonic())
+            self._entries.move_to_end(thread_id)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, thread_id):
+        with self._lock:
+            self._clock += 1
+            self._invalidated[thread_id] = self._clock
+            self._invalidated.move_to_end(thread_id)
+            while len(self._invalidated) > self.max_entries:
+                self._invalidated.popitem(last=False)
+            if self._entries.pop(thread_id, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def checkpoint_id(self, thread_id):
+        """Latest checkpoint id of a cached thread without copying it, or None."""
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                return None
+            return entry[0].checkpoint['id']
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_s': self.ttl,
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            }
+
+
+_state_cache = StateCache() if STATE_CACHE_ENABLED else None
+
+
+def get_state_cache():
+    """Process-wide state cache, or None when STATE_CACHE_ENABLED is off."""
+    return _state_cache
+
+
+def get_state_cache_stats():
+    return _state_cache.stats() if _state_cache is not None else {'enabled': False}
@@ -0,0 +1,106 @@
+"""Response cache: LRU byte budget and TTL, the shared SQLite tier, request bypass."""
+
+import time
+
+import pytest
+
+from src import llm
+from src.cache import MemoryLRU, ResponseCache, cache_key
+
+
+def test_cache_key_covers_model_settings_and_prompt():
+    key = cache_key('fake:a', {'temperature': 0.2}, 'joke')
+    assert key == cache_key('fake:a', {'temperature': 0.2}, 'joke')
+    assert key != cache_key('fake:b', {'temperature': 0.2}, 'joke')
+    assert key != cache_key('fake:a', {'temperature': 0.7}, 'joke')
+    assert key != cache_key('fake:a', {'temperature': 0.2}, 'joke!')
+
+
+def test_lru_evicts_least_recently_used_over_byte_budget():
+    lru = MemoryLRU(max_bytes=25, ttl=60)  # room for two 10-byte entries
+    lru.put('a', 'x' * 9)
+    lru.put('b', 'x' * 9)
+    lru.get('a')  # b is now the least recently used
+    lru.put('c', 'x' * 9)
+
+    assert lru.get('b') is None
+    assert lru.get('a') == 'x' * 9
+    assert lru.get('c') == 'x' * 9
+    assert lru.stats()['evictions'] == 1
+    assert lru.stats()['bytes'] == 20
+
+
+def test_lru_skips_values_larger_than_budget():
+    lru = MemoryLRU(max_bytes=10, ttl=60)
+    lru.put('a', 'x' * 20)
+    assert lru.get('a') is None
+    assert lru.stats()['entries'] == 0
+
+
+def test_lru_expires_entries():
+    lru = MemoryLRU(max_bytes=1000, ttl=60)
+    lru.put('a', 'old', expires_at=time.time() - 1)
+    assert lru.get('a') is None
+    assert lru.stats()['expirations'] == 1
+    assert lru.stats()['bytes'] == 0
+
+
+def test_disk_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(max_bytes=1000, ttl=60, db_path=path).put('k', 'value')
+
+    # A second worker process opens the same file with an empty memory tier
+    other = ResponseCache(max_bytes=1000, ttl=60, db_path=path)
+    assert other.get('k') == 'value'
+    assert other.get('k') == 'value'
+    stats = other.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['misses']) == (1, 1, 0)
+
+
+def test_expired_disk_entries_are_misses(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    ResponseCache(max_bytes=1000, ttl=-1, db_path=path).put('k', 'value')
+
+    other = ResponseCache(max_bytes=1000, ttl=60, db_path=path)
+    assert other.get('k') is None
+    assert other.stats()['misses'] == 1
+
+
+def test_preload_copies_recent_disk_entries(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    writer = ResponseCache(max_bytes=1000, ttl=60, db_path=path)
+    for i in range(5):
+        writer.put(f'k{i}', f'v{i}')
+
+    reader = ResponseCache(max_bytes=1000, ttl=60, db_path=path)
+    assert reader.preload(limit=3) == 3
+    assert reader.memory.stats()['entries'] == 3
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(max_bytes=1 << 20, ttl=60, db_path='')
+    monkeypatch.setattr(llm, 'get_response_cache', lambda: cache)
+    return cache
+
+
+def test_complete_serves_repeats_from_cache(cache):
+    first = llm.complete('tell a joke about caches', model='fake:test')
+    assert llm.complete('tell a joke about caches', model='fake:test') == first
+    stats = cache.stats()
+    assert (stats['misses'], stats['memory_hits']) == (1, 1)
+
+
+def test_no_cache_request_bypasses_cache(cache):
+    llm.complete('tell a joke about bypass', model='fake:test')
+    with llm.request_options(no_cache=True):
+        llm.complete('tell a joke about bypass', model='fake:test')
+    stats = cache.stats()
+    assert stats['bypassed'] == 1
+    assert stats['memory_hits'] == 0
+
+
+def test_use_cache_false_skips_cache(cache):
+    llm.complete('tell a joke about samples', model='fake:test', use_cache=False)
+    assert cache.stats()['misses'] == 0
+    assert cache.stats()['memory']['entries'] == 0
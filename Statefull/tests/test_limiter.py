@@ -0,0 +1,164 @@
+"""AIMD concurrency limiter: slots, FIFO queue, queue timeout, limit adaptation, retries."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.limiter import AdaptiveLimiter, LimiterTimeout, SUCCESS, THROTTLED, FAILED, is_throttle_error
+
+
+def _limiter(**options):
+    params = dict(initial=2, min_limit=1, max_limit=8, increase=1, decrease=0.5,
+                  latency_target=0, cooldown=0, retries=2, backoff=0, queue_timeout=1)
+    params.update(options)
+    return AdaptiveLimiter(**params)
+
+
+def test_is_throttle_error():
+    assert is_throttle_error(RuntimeError("429 RESOURCE_EXHAUSTED: quota"))
+    assert is_throttle_error(RuntimeError("rate limit exceeded"))
+    assert not is_throttle_error(RuntimeError("503 UNAVAILABLE"))
+
+
+def test_callers_over_the_limit_queue_and_are_served_in_order():
+    # No growth on success, so each release hands over exactly one slot
+    limiter = _limiter(initial=1, increase=0)
+    limiter.acquire()
+    order = []
+
+    def waiter(name):
+        limiter.acquire()
+        order.append(name)
+        limiter.release(SUCCESS)
+
+    threads = []
+    for name in ('first', 'second'):
+        thread = threading.Thread(target=waiter, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while limiter.stats()['queue_depth'] < len(threads):
+            time.sleep(0.01)
+
+    assert limiter.stats()['in_flight'] == 1
+    limiter.release(SUCCESS)
+    for thread in threads:
+        thread.join(2)
+    assert order == ['first', 'second']
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_queue_timeout_gives_up_and_leaves_the_queue():
+    limiter = _limiter(initial=1, queue_timeout=0.05)
+    limiter.acquire()
+    with pytest.raises(LimiterTimeout):
+        limiter.acquire()
+    stats = limiter.stats()
+    assert (stats['timeouts'], stats['queue_depth'], stats['in_flight']) == (1, 0, 1)
+
+
+def test_async_queue_timeout():
+    limiter = _limiter(initial=1, queue_timeout=0.05)
+    limiter.acquire()
+
+    async def main():
+        with pytest.raises(LimiterTimeout):
+            await limiter.aacquire()
+
+    asyncio.run(main())
+    assert limiter.stats()['queue_depth'] == 0
+    limiter.release(SUCCESS)
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_try_acquire_never_queues():
+    limiter = _limiter(initial=1)
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.stats()['queued'] == 0
+    limiter.release(SUCCESS)
+    assert limiter.try_acquire()
+
+
+def test_limit_grows_on_success_and_halves_on_throttling():
+    limiter = _limiter(initial=4)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(SUCCESS, latency=0.1)
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+
+    limiter.acquire()
+    limiter.release(THROTTLED)
+    assert limiter.limit == pytest.approx(2.5, abs=0.1)
+    assert limiter.stats()['cuts'] == 1
+
+
+def test_throttling_cuts_once_per_cooldown_and_not_below_min():
+    limiter = _limiter(initial=4, cooldown=60)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(THROTTLED)
+    assert limiter.limit == 2
+    assert limiter.stats()['cuts'] == 1
+
+    limiter = _limiter(initial=1)
+    limiter.acquire()
+    limiter.release(THROTTLED)
+    assert limiter.limit == 1
+
+
+def test_slow_successes_do_not_grow_the_limit():
+    limiter = _limiter(initial=2, latency_target=1)
+    limiter.acquire()
+    limiter.release(SUCCESS, latency=5)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release(FAILED)
+    assert limiter.limit == 2
+
+
+def test_call_retries_throttled_errors():
+    limiter = _limiter()
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+        return 'ok'
+
+    assert limiter.call(flaky) == 'ok'
+    assert len(attempts) == 3
+    assert limiter.stats()['retries'] == 2
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_call_does_not_retry_other_errors():
+    limiter = _limiter()
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise RuntimeError("503 UNAVAILABLE")
+
+    with pytest.raises(RuntimeError):
+        limiter.call(broken)
+    assert len(attempts) == 1
+    assert limiter.stats()['failures'] == 1
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_acall_releases_the_slot_when_cancelled():
+    limiter = _limiter()
+
+    async def main():
+        task = asyncio.ensure_future(limiter.acall(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()['in_flight'] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert limiter.stats()['in_flight'] == 0
@@ -0,0 +1,136 @@
+"""Checkpoint retention against SqliteSaver tables: deletion, compaction, concurrency."""
+
+import sqlite3
+import time
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from src import retention
+from src.retention import RetentionInProgress, SqliteRetentionStore, run_retention
+
+DAY = 86400
+POLICY = dict(completed_ttl=7 * DAY, abandoned_ttl=DAY, keep_latest_only=True, batch_pause=0)
+COMPLETED = {'topic': 'cats', 'joke': 'a joke', 'explanation': 'why it is funny'}
+ABANDONED = {'topic': 'dogs', 'joke': 'a joke'}
+
+
+@pytest.fixture
+def saver(tmp_path):
+    with SqliteSaver.from_conn_string(str(tmp_path / 'checkpoints.db')) as saver:
+        saver.setup()
+        yield saver
+
+
+def _put(saver, thread_id, values, checkpoints=1):
+    """Write a thread's checkpoints (each with one pending write); returns the latest id."""
+    config = {'configurable': {'thread_id': thread_id, 'checkpoint_ns': ''}}
+    for _ in range(checkpoints):
+        checkpoint = empty_checkpoint()
+        checkpoint['channel_values'] = dict(values)
+        config = saver.put(config, checkpoint, {}, {})
+        saver.put_writes(config, [('joke', values.get('joke'))], task_id='task')
+    return config['configurable']['checkpoint_id']
+
+
+def _rows(saver, thread_id):
+    return tuple(
+        saver.conn.execute(f"SELECT count(*) FROM {table} WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+        for table in ('checkpoints', 'writes')
+    )
+
+
+def test_expired_threads_are_deleted_by_kind(saver):
+    _put(saver, 'old-completed', COMPLETED, checkpoints=2)
+    _put(saver, 'old-abandoned', ABANDONED)
+    _put(saver, 'young-abandoned', ABANDONED)
+
+    # 2 days on: past the abandoned TTL, not the completed one
+    report = run_retention(saver, now=time.time() + 2 * DAY, **{**POLICY, 'completed_ttl': DAY})
+    assert report['threads_deleted'] == {'completed': 1, 'abandoned': 2}
+    assert _rows(saver, 'old-completed') == (0, 0)
+    assert _rows(saver, 'old-abandoned') == (0, 0)
+    assert report['rows_deleted']['checkpoints'] == 4
+    assert report['rows_deleted']['writes'] == 4
+    assert report['bytes_reclaimed']['total'] > 0
+
+
+def test_abandoned_threads_outlive_only_their_ttl(saver):
+    _put(saver, 'completed', COMPLETED)
+    _put(saver, 'abandoned', ABANDONED)
+
+    report = run_retention(saver, now=time.time() + 2 * DAY, **POLICY)
+    assert report['threads_deleted'] == {'completed': 0, 'abandoned': 1}
+    assert _rows(saver, 'completed') == (1, 1)
+    assert _rows(saver, 'abandoned') == (0, 0)
+
+
+def test_young_completed_threads_are_compacted_to_the_latest_checkpoint(saver):
+    latest = _put(saver, 'completed', COMPLETED, checkpoints=3)
+    _put(saver, 'unfinished', ABANDONED, checkpoints=3)
+
+    report = run_retention(saver, now=time.time(), **POLICY)
+    assert report['threads_compacted'] == 1
+    assert _rows(saver, 'completed') == (1, 1)
+    assert _rows(saver, 'unfinished') == (3, 3)
+    kept = saver.get_tuple({'configurable': {'thread_id': 'completed', 'checkpoint_ns': ''}})
+    assert kept.config['configurable']['checkpoint_id'] == latest
+    assert kept.checkpoint['channel_values'] == COMPLETED
+
+
+def test_dry_run_reports_without_deleting(saver):
+    _put(saver, 'abandoned', ABANDONED, checkpoints=2)
+
+    report = run_retention(saver, now=time.time() + 2 * DAY, dry_run=True, **POLICY)
+    assert report['dry_run'] is True
+    assert report['threads_deleted']['abandoned'] == 1
+    assert report['rows_deleted']['checkpoints'] == 2
+    assert _rows(saver, 'abandoned') == (2, 2)
+
+
+def test_threads_written_after_classification_are_kept_and_not_counted(saver, monkeypatch):
+    _put(saver, 'active', ABANDONED)
+    _put(saver, 'idle', ABANDONED)
+    run_batch = SqliteRetentionStore.run_batch
+
+    def racing_run_batch(store, deletes, compactions, dry_run=False):
+        # A request writes to the thread between the scan and the delete
+        _put(saver, 'active', ABANDONED)
+        return run_batch(store, deletes, compactions, dry_run)
+
+    monkeypatch.setattr(SqliteRetentionStore, 'run_batch', racing_run_batch)
+    report = run_retention(saver, now=time.time() + 2 * DAY, **POLICY)
+    assert report['threads_deleted'] == {'completed': 0, 'abandoned': 1}
+    assert _rows(saver, 'active') == (2, 2)
+    assert _rows(saver, 'idle') == (0, 0)
+
+
+def test_locked_database_skips_the_batch(saver, tmp_path, monkeypatch):
+    _put(saver, 'abandoned', ABANDONED)
+    monkeypatch.setattr(retention, 'store_for', lambda s: SqliteRetentionStore(s, lock_timeout_ms=50))
+    writer = sqlite3.connect(str(tmp_path / 'checkpoints.db'), isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        report = run_retention(saver, now=time.time() + 2 * DAY, **POLICY)
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+    assert report['batches_skipped'] == 1
+    assert report['threads_deleted'] == {'completed': 0, 'abandoned': 0}
+    assert _rows(saver, 'abandoned') == (1, 1)
+
+
+def test_batches_walk_every_thread(saver):
+    for i in range(5):
+        _put(saver, f'thread-{i}', ABANDONED)
+
+    report = run_retention(saver, now=time.time() + 2 * DAY, batch_size=2, **POLICY)
+    assert report['threads_scanned'] == 5
+    assert report['threads_deleted']['abandoned'] == 5
+
+
+def test_only_one_run_at_a_time(saver):
+    with retention._run_lock:
+        with pytest.raises(RetentionInProgress):
+            run_retention(saver, **POLICY)
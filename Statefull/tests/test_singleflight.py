@@ -0,0 +1,110 @@
+"""Single-flight coalescing of identical in-flight calls, sync and async."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import llm
+from src.singleflight import SingleFlight
+
+
+def _run_together(n, fn):
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        return [f.result() for f in [executor.submit(fn) for _ in range(n)]]
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return 'joke'
+
+    def call():
+        return flights.do('key', upstream)
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(call) for _ in range(5)]
+        # Every caller has joined the flight before the leader returns
+        while flights.stats()['collapsed'] < 4:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert results == ['joke'] * 5
+    assert len(calls) == 1
+    assert flights.stats()['upstream_calls'] == 1
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_error_is_shared_and_key_is_forgotten():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    def call():
+        try:
+            return flights.do('key', failing)
+        except RuntimeError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(call) for _ in range(3)]
+        while flights.stats()['collapsed'] < 2:
+            time.sleep(0.01)
+        release.set()
+        assert [f.result() for f in futures] == ['upstream down'] * 3
+
+    # A finished flight is not reused
+    assert flights.do('key', lambda: 'fresh') == 'fresh'
+
+
+def test_async_callers_share_one_task_and_survive_a_cancelled_caller():
+    flights = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'joke'
+
+    async def main():
+        callers = [asyncio.ensure_future(flights.ado('key', upstream)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        callers[0].cancel()
+        results = await asyncio.gather(*callers[1:])
+        return results
+
+    assert asyncio.run(main()) == ['joke'] * 3
+    assert len(calls) == 1
+    assert flights.stats()['collapsed'] == 3
+
+
+@pytest.fixture
+def flights(monkeypatch):
+    flights = SingleFlight()
+    monkeypatch.setattr(llm, '_flights', flights)
+    monkeypatch.setattr(llm, 'get_response_cache', lambda: None)
+    return flights
+
+
+def test_complete_coalesces_identical_prompts(flights):
+    results = _run_together(4, lambda: llm.complete('joke about flights', model='fake:sf', latency='fixed:0.2'))
+    assert len(set(results)) == 1
+    assert flights.stats()['upstream_calls'] + flights.stats()['collapsed'] == 4
+    assert flights.stats()['collapsed'] >= 1
+
+
+def test_complete_without_cache_is_never_coalesced(flights):
+    _run_together(4, lambda: llm.complete('joke about samples', model='fake:sf', latency='fixed:0.2', use_cache=False))
+    assert flights.stats()['upstream_calls'] == 0
+    assert flights.stats()['collapsed'] == 0
@@ -1,22 +1,54 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel,Field
-from typing import Optional
+from src.startup import startup_phase, get_startup_report  # starts the startup clock
+
+with startup_phase("import fastapi"):
+    from fastapi import FastAPI, HTTPException, Response
+    from fastapi.concurrency import run_in_threadpool
+    from pydantic import BaseModel,Field
+    import uvicorn
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Union
 from typing import Annotated
-import uvicorn
-from src.graph import start_joke_generation, continue_workflow
+import asyncio
+with startup_phase("import src"):
+    from src.graph import start_joke_generation, continue_workflow, astart_joke_generation, acontinue_workflow, GRAPH_MODE, WORKFLOW_MODE, STOP_NODES
+    from src.config import get_llm_stats, ASYNC_EXECUTION, EXECUTION_MODE
+    from src.cache import get_cache_stats
+    from src.breaker import get_breaker_stats
+    from src.state_token import encode_state, decode_state, state_tokens_enabled, InvalidStateToken, STATE_FIELDS
+    from src.llm import get_singleflight_stats, get_limiter_stats, get_hedging_stats
+
+    from src.readiness import warm_up as readiness_warm_up, is_ready, get_readiness
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so the server accepts connections (and answers
+    # /health) right away; /ready turns 200 when it is done, and requests
+    # arriving meanwhile wait for the workflow
+    warm_up = asyncio.create_task(readiness_warm_up())
+    yield
+    warm_up.cancel()
 
 # Create interrupt-based FastAPI app
 app = FastAPI(
     title="Interrupt-Based Joke Generation API", 
     version="3.0.0",
-    description="API with interrupt-based routing (NO persistence/DB)"
+    description="API with interrupt-based routing (NO persistence/DB)",
+    lifespan=lifespan
 )
 
 # Request models
 class StartRequest(BaseModel):
     topic: str
+    no_cache: bool = False
+    delta: bool = False
 
-class ContinueRequest(BaseModel):
+class RunRequest(BaseModel):
+    topic: str
+    run_until: str = "END"
+    no_cache: bool = False
+    delta: bool = False
+
+class WorkflowState(BaseModel):
     topic: str
     joke: Optional[str] = None
     explanation: Optional[str] = None
@@ -24,24 +56,52 @@ class ContinueRequest(BaseModel):
     alternative: Optional[str] = None
     next_node: str
     status: str
+    # Incremented by every call that runs nodes
+    version: int = 0
+
+class ContinueRequest(BaseModel):
+    # Either the full state fields, or the state_token returned by the previous call
+    # (only the token when STATE_TOKEN_SECRET is set)
+    topic: Optional[str] = None
+    joke: Optional[str] = None
+    explanation: Optional[str] = None
+    rating: Optional[str] = None
+    alternative: Optional[str] = None
+    next_node: Optional[str] = None
+    status: Optional[str] = None
+    state_token: Optional[str] = None
+    # Version of the state being sent; checked against the signed version of a state_token
+    version: Optional[int] = Field(None, ge=0)
 
 class StateResponse(BaseModel):
     success: Annotated[bool,Field(..., description="Indicates if the request was successful")]
-    state: Annotated[ContinueRequest,Field(..., description="Current state of the workflow")]
+    state: Annotated[WorkflowState,Field(..., description="Current state of the workflow")]
+    completed: Annotated[bool,Field(..., description="Indicates if the workflow is completed")]
+    message: Annotated[str,Field(..., description="Informational message about the workflow")]
+    state_token: Annotated[Optional[str],Field(None, description="Signed state to send to /continue instead of the fields")] = None
+
+class DeltaResponse(BaseModel):
+    success: Annotated[bool,Field(..., description="Indicates if the request was successful")]
+    version: Annotated[int,Field(..., description="State version after this call")]
+    changes: Annotated[Dict[str, Optional[str]],Field(..., description="State fields changed by the nodes just executed")]
     completed: Annotated[bool,Field(..., description="Indicates if the workflow is completed")]
     message: Annotated[str,Field(..., description="Informational message about the workflow")]
+    state_token: Annotated[Optional[str],Field(None, description="Signed state to send to /continue instead of the fields")] = None
     
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Interrupt-Based Joke Generation API is running!",
         "version": "3.0.0 (No DB - Interrupt-based)",
         "description": "State is returned after each node and sent back in continue endpoint",
         "endpoints": [
-            "/health",
+            "/health - Liveness",
+            "/ready - Readiness (503 until warmed up)",
+            "/metrics - LLM client and pool metrics",
             "/start - Start joke generation (returns state + next_node)",
-            "/continue - Continue with provided state (auto-routes based on next_node)"
+            "/continue - Continue with provided state or state_token (auto-routes based on next_node; ?run_until=<node|END> runs several nodes)",
+            "/run - Run from the topic through run_until (default END) in one request"
         ],
         "nodes": [
             "generate_joke",
@@ -52,70 +112,151 @@ def read_root():
     }
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {
         "status": "healthy", 
         "persistence": "None - Interrupt-based routing",
-        "mode": "stateless"
+        "mode": "stateless",
+        "graph_mode": GRAPH_MODE,
+        "workflow_mode": WORKFLOW_MODE,
+        "state_tokens": state_tokens_enabled(),
+        "execution_mode": EXECUTION_MODE,
+        "llm_breakers": get_breaker_stats()
+    }
+
+@app.get("/ready")
+async def ready_check(response: Response):
+    # Route traffic on this, not /health: it waits for the LLM client and caches
+    if not is_ready():
+        response.status_code = 503
+    return get_readiness()
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "llm_clients": get_llm_stats(),
+        "llm_cache": get_cache_stats(),
+        "llm_limiter": get_limiter_stats(),
+        "llm_hedging": get_hedging_stats(),
+        "llm_singleflight": get_singleflight_stats(),
+        "startup": get_startup_report()
     }
 
-@app.post("/start",response_model = StateResponse,response_description="State after starting workflow")
-def start_endpoint(request: StartRequest):
+def _state_response(result, pending_message, version, previous=None):
+    """StateResponse body for a workflow result, or a DeltaResponse body when
+    previous (the state the call started from) is given."""
+    is_completed = result.get('next_node') == 'END'
+    body = {
+        "success": True,
+        "completed": is_completed,
+        "message": result.get('message', 'Workflow completed successfully') if is_completed else pending_message.format(next_node=result['next_node']),
+        "state_token": encode_state({**result, 'version': version}) if state_tokens_enabled() and not is_completed else None
+    }
+    if previous is not None:
+        body["version"] = version
+        body["changes"] = {
+            field: result.get(field) for field in STATE_FIELDS
+            if field != 'version' and result.get(field) != previous.get(field)
+        }
+    else:
+        body["state"] = {
+            "topic": result['topic'],
+            "joke": result['joke'],
+            "explanation": result['explanation'],
+            "rating": result['rating'],
+            "alternative": result['alternative'],
+            "next_node": result['next_node'],
+            "status": result['status'],
+            "version": version
+        }
+    return body
+
+def _check_run_until(run_until):
+    if run_until is not None and run_until not in STOP_NODES:
+        raise HTTPException(status_code=422, detail=f"run_until must be one of {', '.join(STOP_NODES)}")
+
+@app.post("/start",response_model = Union[StateResponse, DeltaResponse],response_description="State (or delta) after starting workflow")
+async def start_endpoint(request: StartRequest):
     try:
         print(f"API /start - topic: {request.topic}")
-        result = start_joke_generation(request.topic)
+        if ASYNC_EXECUTION:
+            result = await astart_joke_generation(request.topic, request.no_cache)
+        else:
+            result = await run_in_threadpool(start_joke_generation, request.topic, request.no_cache)
         
-        return {
-            "success": True,
-            "state": {
-                "topic": result['topic'],
-                "joke": result['joke'],
-                "explanation": result['explanation'],
-                "rating": result['rating'],
-                "alternative": result['alternative'],
-                "next_node": result['next_node'],
-                "status": result['status']
-            },
-            "completed": False,
-            "message": f"Node executed. Next node: {result['next_node']}. Send this state to /continue."
-        }
+        return _state_response(result, "Node executed. Next node: {next_node}. Send this state to /continue.",
+                               version=1, previous={} if request.delta else None)
     except Exception as e:
         print(f"API error in /start: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-@app.post("/continue",response_model= StateResponse,response_description="State after continuing workflow")
-def continue_endpoint(request: ContinueRequest):
+@app.post("/continue",response_model= Union[StateResponse, DeltaResponse],response_description="State (or delta) after continuing workflow")
+async def continue_endpoint(request: ContinueRequest, no_cache: bool = False, run_until: Optional[str] = None, delta: bool = False):
     try:
-        # Convert request to state dict
-        state = {
-            "topic": request.topic,
-            "joke": request.joke,
-            "explanation": request.explanation,
-            "rating": request.rating,
-            "alternative": request.alternative,
-            "next_node": request.next_node,
-            "status": request.status
-        }
-        
-        print(f"API /continue - routing to: {request.next_node}")
-        result = continue_workflow(state)
+        _check_run_until(run_until)
+        if request.state_token:
+            if not state_tokens_enabled():
+                raise HTTPException(status_code=400, detail="State tokens are not enabled on this server")
+            # Signed by us, so the fields are trusted as-is
+            try:
+                state = decode_state(request.state_token)
+            except InvalidStateToken as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            version = state.pop('version', None) or 0
+            if request.version is not None and request.version != version:
+                raise HTTPException(status_code=409, detail=f"State version conflict: token is at version {version}, request says {request.version}")
+        else:
+            if state_tokens_enabled():
+                # Signing client-supplied fields would let any client mint a trusted token
+                raise HTTPException(status_code=400, detail="This server issues state tokens: send the state_token from the previous response")
+            # No trusted base to merge a partial state into: the body is the whole state
+            missing = [field for field in STATE_FIELDS if field not in request.model_fields_set]
+            if missing or None in (request.topic, request.next_node, request.status, request.version):
+                raise HTTPException(status_code=422, detail=f"Send either state_token or the full state (missing: {', '.join(missing) or 'values for topic, next_node, status and version'})")
+            # Convert request to state dict
+            state = {
+                "topic": request.topic,
+                "joke": request.joke,
+                "explanation": request.explanation,
+                "rating": request.rating,
+                "alternative": request.alternative,
+                "next_node": request.next_node,
+                "status": request.status
+            }
+            version = request.version
         
-        is_completed = result.get('next_node') == 'END'
+        print(f"API /continue - routing to: {state['next_node']}")
+        if ASYNC_EXECUTION:
+            result = await acontinue_workflow(state, no_cache, run_until)
+        else:
+            result = await run_in_threadpool(continue_workflow, state, no_cache, run_until)
         
-        return {
-            "success": True,
-            "state": {
-                "topic": result['topic'],
-                "joke": result['joke'],
-                "explanation": result['explanation'],
-                "rating": result['rating'],
-                "alternative": result['alternative'],
-                "next_node": result['next_node'],
-                "status": result['status']
-            },
-            "completed": is_completed,
-            "message": result.get('message') if is_completed else f"Node executed. Next node: {result['next_node']}. Send this state to /continue again."
-        }
+        # A state already at END runs no node, so its version stays
+        if state['next_node'] != 'END':
+            version += 1
+        return _state_response(result, "Node executed. Next node: {next_node}. Send this state to /continue again.",
+                               version=version, previous=state if delta else None)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"API error in /continue: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.post("/run",response_model= Union[StateResponse, DeltaResponse],response_description="State (or delta) after running through run_until")
+async def run_endpoint(request: RunRequest):
+    """Run several nodes in one graph invocation instead of one request per node."""
+    try:
+        _check_run_until(request.run_until)
+        print(f"API /run - topic: {request.topic}, until: {request.run_until}")
+        if ASYNC_EXECUTION:
+            result = await astart_joke_generation(request.topic, request.no_cache, request.run_until)
+        else:
+            result = await run_in_threadpool(start_joke_generation, request.topic, request.no_cache, request.run_until)
+        
+        return _state_response(result, f"Stopped after {request.run_until}. Next node: {{next_node}}. Send this state to /continue.",
+                               version=1, previous={} if request.delta else None)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"API error in /run: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -0,0 +1,208 @@
+"""Per-model circuit breaker for LLM calls.
+
+A breaker opens when, over a sliding time window, too many calls to its model
+fail or run slower than the slow-call threshold. While open, calls fail fast
+(or are rerouted to FALLBACK_MODEL_NAME by the caller) instead of waiting out
+client timeouts. After the open period a few probe calls are let through
+(half-open); if they all succeed the breaker closes, otherwise it reopens.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from .limiter import is_throttle_error
+
+LLM_BREAKER_ENABLED = os.getenv("LLM_BREAKER_ENABLED", "true").lower() == "true"
+# Sliding window (seconds) and the minimum number of calls in it before tripping
+LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "60"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "20"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+# Calls slower than this (seconds) count as slow; 0 disables the latency check
+LLM_BREAKER_SLOW_CALL = float(os.getenv("LLM_BREAKER_SLOW_CALL", "15"))
+LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+# Concurrent probe calls while half-open; this many successes close the breaker
+LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "3"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose breaker is open."""
+
+    def __init__(self, model):
+        super().__init__(f"Circuit breaker open for model {model}")
+        self.model = model
+
+
+class CircuitBreaker:
+    """Error-rate / slow-call-rate breaker with half-open probing."""
+
+    def __init__(self, name, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS,
+                 error_rate=LLM_BREAKER_ERROR_RATE, slow_call=LLM_BREAKER_SLOW_CALL,
+                 slow_rate=LLM_BREAKER_SLOW_RATE, open_seconds=LLM_BREAKER_OPEN_SECONDS,
+                 probes=LLM_BREAKER_PROBES):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._calls = deque()  # (finished_at, failed, slow)
+        self._failures = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+
+    # -- state ---------------------------------------------------------------
+
+    def _prune(self, now):
+        while self._calls and self._calls[0][0] < now - self.window:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _trip(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self._failures = self._slow = 0
+        self._stats['opened'] += 1
+        print(f"Circuit breaker opened for model {self.name}")
+
+    def rejecting(self):
+        """True while open and still inside the open period (no state change)."""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def allow(self):
+        """Whether a call may go upstream now; half-open admits a few probes."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+                print(f"Circuit breaker half-open for model {self.name}")
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record(self, failed, latency=0.0):
+        """Record a finished call; failed=None releases a probe without a verdict."""
+        now = time.monotonic()
+        slow = bool(self.slow_call) and latency > self.slow_call
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if failed is None:
+                return
+
+            self._stats['calls'] += 1
+            self._stats['failures'] += failed
+            self._stats['slow_calls'] += slow
+
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._trip(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.probes:
+                    self.state = CLOSED
+                    print(f"Circuit breaker closed for model {self.name}")
+                return
+            if self.state == OPEN:
+                # A call admitted before the breaker opened
+                return
+
+            self._calls.append((now, failed, slow))
+            self._failures += failed
+            self._slow += slow
+            self._prune(now)
+            count = len(self._calls)
+            if count >= self.min_calls and (self._failures / count >= self.error_rate
+                                            or self._slow / count >= self.slow_rate):
+                self._trip(now)
+
+    # -- calls ---------------------------------------------------------------
+
+    def call(self, fn):
+        """Run fn() if the breaker admits it, recording the outcome."""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            # Throttling is the concurrency limiter's signal, not an outage
+            self.record(None if is_throttle_error(e) else True)
+            raise
+        self.record(False, time.perf_counter() - started)
+        return result
+
+    async def acall(self, coro_fn):
+        """Async version of call."""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        started = time.perf_counter()
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            self.record(None)
+            raise
+        except Exception as e:
+            self.record(None if is_throttle_error(e) else True)
+            raise
+        self.record(False, time.perf_counter() - started)
+        return result
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            count = len(self._calls)
+            stats = {
+                'state': self.state,
+                **self._stats,
+                'window_calls': count,
+                'window_error_rate': round(self._failures / count, 4) if count else 0.0,
+                'window_slow_rate': round(self._slow / count, 4) if count else 0.0,
+            }
+            if self.state == OPEN:
+                remaining = self.open_seconds - (time.monotonic() - self._opened_at)
+                stats['retry_in_s'] = round(max(0.0, remaining), 2)
+            return stats
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model):
+    """Breaker for a model, or None when LLM_BREAKER_ENABLED is off."""
+    if not LLM_BREAKER_ENABLED:
+        return None
+    breaker = _breakers.get(model)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(model, CircuitBreaker(model))
+    return breaker
+
+
+def get_breaker_stats():
+    if not LLM_BREAKER_ENABLED:
+        return {'enabled': False}
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {'enabled': True, 'models': {model: b.stats() for model, b in breakers.items()}}
@@ -1,4 +1,12 @@
-from .config import get_llm
+from pydantic import ValidationError
+from .llm import complete, acomplete
+from .models import JokeDetails
+
+STRUCTURED_PROMPT = (
+    'Generate a funny joke, explain why it is funny, rate it on a scale of 1-10 with reasoning '
+    'and write an alternative version of it. Respond with only a JSON object with the keys '
+    '"joke", "explanation", "rating" and "alternative". Topic: {topic}'
+)
 
 def router_node(state):
     next_node = state.get("next_node", "generate_joke")
@@ -8,12 +16,11 @@ def router_node(state):
 def generate_joke(state):
     """Generate a joke based on the topic."""
     try:
-        llm = get_llm()
         topic = state.get("topic", "general")
         prompt = f'Generate a funny joke about {topic}'
         
         print(f"Generating joke for topic: {topic}")
-        response = llm.invoke(prompt).content
+        response = complete(prompt)
         print("Joke generated successfully")
         
         return {
@@ -33,12 +40,11 @@ def generate_joke(state):
 
 def generate_explanation(state):
     try:
-        llm = get_llm()
         joke = state.get("joke", "")
         prompt = f'Explain why this joke is funny: {joke}'
         
         print("Generating explanation for joke")
-        response = llm.invoke(prompt).content
+        response = complete(prompt)
         print("Explanation generated successfully")
         
         return {
@@ -59,12 +65,11 @@ def generate_explanation(state):
 def generate_rating(state):
     """Rate the joke on a scale of 1-10 with reasoning."""
     try:
-        llm = get_llm()
         joke = state.get("joke", "")
         prompt = f'Rate this joke on a scale of 1-10 and provide reasoning for your rating: {joke}'
         
         print("Generating rating for joke")
-        response = llm.invoke(prompt).content
+        response = complete(prompt)
         print("Rating generated successfully")
         
         return {
@@ -85,13 +90,113 @@ def generate_rating(state):
 def generate_alternative(state):
     """Generate an alternative version of the joke."""
     try:
-        llm = get_llm()
         joke = state.get("joke", "")
         topic = state.get("topic", "general")
         prompt = f'Generate an alternative version of this joke about {topic}: {joke}'
         
         print("Generating alternative version of joke")
-        response = llm.invoke(prompt).content
+        response = complete(prompt)
+        print("Alternative generated successfully")
+        
+        return {
+            'alternative': response,
+            'next_node': 'END',
+            'status': 'completed'
+        }
+        
+    except Exception as e:
+        print(f"Error generating alternative: {str(e)}")
+        return {
+            'alternative': "Sorry, I couldn't generate an alternative joke.",
+            'next_node': 'END',
+            'status': 'error'
+        }
+
+
+async def agenerate_joke(state):
+    """Async variant of generate_joke for the async execution path."""
+    try:
+        topic = state.get("topic", "general")
+        prompt = f'Generate a funny joke about {topic}'
+        
+        print(f"Generating joke for topic: {topic}")
+        response = await acomplete(prompt)
+        print("Joke generated successfully")
+        
+        return {
+            'joke': response,
+            'next_node': 'generate_explanation',
+            'status': 'joke_generated'
+        }
+        
+    except Exception as e:
+        print(f"Error generating joke: {str(e)}")
+        return {
+            'joke': f"Sorry, I couldn't generate a joke about {topic} right now.",
+            'next_node': 'generate_explanation',
+            'status': 'error'
+        }
+
+
+async def agenerate_explanation(state):
+    """Async variant of generate_explanation for the async execution path."""
+    try:
+        joke = state.get("joke", "")
+        prompt = f'Explain why this joke is funny: {joke}'
+        
+        print("Generating explanation for joke")
+        response = await acomplete(prompt)
+        print("Explanation generated successfully")
+        
+        return {
+            'explanation': response,
+            'next_node': 'generate_rating',
+            'status': 'explanation_generated'
+        }
+        
+    except Exception as e:
+        print(f"Error generating explanation: {str(e)}")
+        return {
+            'explanation': "Sorry, I couldn't generate an explanation for this joke.",
+            'next_node': 'generate_rating',
+            'status': 'error'
+        }
+
+
+async def agenerate_rating(state):
+    """Async variant of generate_rating for the async execution path."""
+    try:
+        joke = state.get("joke", "")
+        prompt = f'Rate this joke on a scale of 1-10 and provide reasoning for your rating: {joke}'
+        
+        print("Generating rating for joke")
+        response = await acomplete(prompt)
+        print("Rating generated successfully")
+        
+        return {
+            'rating': response,
+            'next_node': 'generate_alternative',
+            'status': 'rating_generated'
+        }
+        
+    except Exception as e:
+        print(f"Error generating rating: {str(e)}")
+        return {
+            'rating': "Sorry, I couldn't generate a rating for this joke.",
+            'next_node': 'generate_alternative',
+            'status': 'error'
+        }
+
+
+async def agenerate_alternative(state):
+    """Async variant of generate_alternative for the async execution path."""
+    try:
+        joke = state.get("joke", "")
+        topic = state.get("topic", "general")
+        prompt = f'Generate an alternative version of this joke about {topic}: {joke}'
+        
+        print("Generating alternative version of joke")
+        response = await acomplete(prompt)
         print("Alternative generated successfully")
         
         return {
@@ -107,3 +212,75 @@ def generate_alternative(state):
             'next_node': 'END',
             'status': 'error'
         }
+
+
+def join_details(state):
+    """Join point after the parallel explanation/rating/alternative branches."""
+    failed = state.get('failed_branches') or []
+    if failed:
+        print(f"Details generated, failed branches: {', '.join(failed)}")
+    else:
+        print("Explanation, rating and alternative generated")
+    return {
+        'next_node': 'END',
+        'status': 'error' if failed else 'completed'
+    }
+
+
+def parse_structured(text, schema):
+    """Validate a JSON answer (optionally wrapped in a code fence) against a schema.
+
+    Returns the validated fields as a dict, or None when the answer is not
+    valid JSON for the schema.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        return schema.model_validate_json(text[start:end + 1]).model_dump()
+    except ValidationError:
+        return None
+
+
+def generate_structured(state):
+    """Generate every field with one structured call, or fall back to generate_joke."""
+    try:
+        topic = state.get("topic", "general")
+        print(f"Generating structured joke for topic: {topic}")
+        response = complete(STRUCTURED_PROMPT.format(topic=topic))
+        parsed = parse_structured(response, JokeDetails)
+        if parsed is None:
+            print("Structured answer did not match the schema, falling back to node-by-node")
+            return {'next_node': 'generate_joke', 'status': 'structured_fallback'}
+        print("Structured joke generated successfully")
+        return {
+            **parsed,
+            'next_node': 'END',
+            'status': 'completed'
+        }
+
+    except Exception as e:
+        print(f"Error generating structured joke: {str(e)}")
+        return {'next_node': 'generate_joke', 'status': 'structured_fallback'}
+
+
+async def agenerate_structured(state):
+    """Async variant of generate_structured for the async execution path."""
+    try:
+        topic = state.get("topic", "general")
+        print(f"Generating structured joke for topic: {topic}")
+        response = await acomplete(STRUCTURED_PROMPT.format(topic=topic))
+        parsed = parse_structured(response, JokeDetails)
+        if parsed is None:
+            print("Structured answer did not match the schema, falling back to node-by-node")
+            return {'next_node': 'generate_joke', 'status': 'structured_fallback'}
+        print("Structured joke generated successfully")
+        return {
+            **parsed,
+            'next_node': 'END',
+            'status': 'completed'
+        }
+
+    except Exception as e:
+        print(f"Error generating structured joke: {str(e)}")
+        return {'next_node': 'generate_joke', 'status': 'structured_fallback'}
@@ -1,16 +1,125 @@
 """Stateful workflow for joke generation WITHOUT persistence - interrupt-based routing."""
 
-from langgraph.graph import StateGraph, START, END
-from .models import JokeState
-from .core import router_node, generate_joke, generate_explanation, generate_rating, generate_alternative
+import asyncio
+import os
+import threading
+from langgraph.constants import START, END
+from .models import JokeState, FanoutJokeState
+from .core import (
+    router_node, generate_joke, generate_explanation, generate_rating, generate_alternative,
+    agenerate_joke, agenerate_explanation, agenerate_rating, agenerate_alternative, join_details,
+    generate_structured, agenerate_structured
+)
+from .llm import request_options
+from .startup import startup_phase
+
+# "sequential" runs one node per request; "fanout" runs explanation, rating and
+# alternative as parallel branches after the joke and returns them together
+GRAPH_MODE = os.getenv("GRAPH_MODE", "sequential").lower()
+# "structured" makes /start ask for every field in one JSON call, falling back
+# to the node-by-node path when the answer does not parse
+WORKFLOW_MODE = os.getenv("WORKFLOW_MODE", "node_by_node").lower()
+FIRST_NODE = 'generate_structured' if WORKFLOW_MODE == "structured" else 'generate_joke'
+
+# Fan-out branch node -> the state field it fills
+DETAIL_NODES = {
+    'generate_explanation': 'explanation',
+    'generate_rating': 'rating',
+    'generate_alternative': 'alternative',
+}
 
 def route_from_start(state):
     next_node = state.get("next_node", "generate_joke")
     print(f"Routing from START to: {next_node}")
     return next_node
 
+def route_fanout(state):
+    """Like route_from_start, but fans out to every detail node still missing."""
+    next_node = state.get("next_node", "generate_joke")
+    if next_node in DETAIL_NODES:
+        branches = [node for node, field in DETAIL_NODES.items() if not state.get(field)]
+        print(f"Fanning out to: {', '.join(branches) or 'join_details'}")
+        return branches or 'join_details'
+    print(f"Routing from START to: {next_node}")
+    return next_node
+
+def _branch(node, func, afunc):
+    """Wrap a detail node so it only writes its own field.
+
+    Parallel branches run in the same step, and two of them writing
+    next_node/status would conflict; join_details sets those once. A failed
+    branch is added to failed_branches instead of setting status.
+    """
+    from langchain_core.runnables import RunnableLambda
+    field = DETAIL_NODES[node]
+
+    def update(result):
+        if result.get('status') == 'error':
+            return {field: result[field], 'failed_branches': [node]}
+        return {field: result[field]}
+
+    def run(state):
+        return update(func(state))
+
+    async def arun(state):
+        return update(await afunc(state))
+
+    return RunnableLambda(run, afunc=arun, name=node)
+
+def _import_langgraph():
+    # Deferred until the workflow is built: langgraph takes ~0.6s to import
+    with startup_phase("import langgraph"):
+        from langgraph.graph import StateGraph
+        from langchain_core.runnables import RunnableLambda
+    return StateGraph, RunnableLambda
+
+def create_fanout_workflow():
+    print("Setting up fan-out joke generation workflow (NO DB)")
+    StateGraph, RunnableLambda = _import_langgraph()
+
+    graph = StateGraph(FanoutJokeState)
+    graph.add_node('router', router_node)
+    graph.add_node('generate_joke', RunnableLambda(generate_joke, afunc=agenerate_joke, name='generate_joke'))
+    graph.add_node('generate_structured', RunnableLambda(generate_structured, afunc=agenerate_structured, name='generate_structured'))
+    graph.add_node('generate_explanation', _branch('generate_explanation', generate_explanation, agenerate_explanation))
+    graph.add_node('generate_rating', _branch('generate_rating', generate_rating, agenerate_rating))
+    graph.add_node('generate_alternative', _branch('generate_alternative', generate_alternative, agenerate_alternative))
+    graph.add_node('join_details', join_details)
+
+    graph.add_edge(START, 'router')
+    graph.add_conditional_edges(
+        'router',
+        route_fanout,
+        {
+            'generate_joke': 'generate_joke',
+            'generate_structured': 'generate_structured',
+            'generate_explanation': 'generate_explanation',
+            'generate_rating': 'generate_rating',
+            'generate_alternative': 'generate_alternative',
+            'join_details': 'join_details',
+            'END': END
+        }
+    )
+    graph.add_edge('generate_joke', 'router')
+    # Not interrupted: a parsed answer ends the run, a failed one goes on to generate_joke
+    graph.add_edge('generate_structured', 'router')
+    # Branches started together run in one step, so join_details runs once after all of them
+    for node in DETAIL_NODES:
+        graph.add_edge(node, 'join_details')
+    graph.add_edge('join_details', END)
+
+    # Two round-trips: the joke, then all details at once
+    workflow = graph.compile(interrupt_after=['generate_joke', 'join_details'])
+    print("Fan-out workflow setup completed WITHOUT persistence")
+
+    return workflow
+
 def create_workflow():
+    if GRAPH_MODE == "fanout":
+        return create_fanout_workflow()
+
     print("Setting up interrupt-based joke generation workflow (NO DB)")
+    StateGraph, RunnableLambda = _import_langgraph()
     
     # Create the state graph
     graph = StateGraph(JokeState)
@@ -18,11 +127,12 @@ def create_workflow():
     # Add router node
     graph.add_node('router', router_node)
     
-    # Add all processing nodes
-    graph.add_node('generate_joke', generate_joke)
-    graph.add_node('generate_explanation', generate_explanation)
-    graph.add_node('generate_rating', generate_rating)
-    graph.add_node('generate_alternative', generate_alternative)
+    # Add all processing nodes (sync function for invoke, async function for ainvoke)
+    graph.add_node('generate_joke', RunnableLambda(generate_joke, afunc=agenerate_joke, name='generate_joke'))
+    graph.add_node('generate_structured', RunnableLambda(generate_structured, afunc=agenerate_structured, name='generate_structured'))
+    graph.add_node('generate_explanation', RunnableLambda(generate_explanation, afunc=agenerate_explanation, name='generate_explanation'))
+    graph.add_node('generate_rating', RunnableLambda(generate_rating, afunc=agenerate_rating, name='generate_rating'))
+    graph.add_node('generate_alternative', RunnableLambda(generate_alternative, afunc=agenerate_alternative, name='generate_alternative'))
     
     # Connect START to router
     graph.add_edge(START, 'router')
@@ -33,6 +143,7 @@ def create_workflow():
         route_from_start,
         {
             'generate_joke': 'generate_joke',
+            'generate_structured': 'generate_structured',
             'generate_explanation': 'generate_explanation',
             'generate_rating': 'generate_rating',
             'generate_alternative': 'generate_alternative',
@@ -42,6 +153,8 @@ def create_workflow():
     
     # All nodes go back to router for next routing decision
     graph.add_edge('generate_joke', 'router')
+    # Not interrupted: a parsed answer ends the run, a failed one goes on to generate_joke
+    graph.add_edge('generate_structured', 'router')
     graph.add_edge('generate_explanation', 'router')
     graph.add_edge('generate_rating', 'router')
     graph.add_edge('generate_alternative', 'router')
@@ -53,10 +166,49 @@ def create_workflow():
     print("Workflow setup completed WITHOUT persistence - interrupt-based routing")
     
     return workflow
-# Create global workflow instance
-workflow = create_workflow()
 
-def start_joke_generation(topic: str):
+_workflows = None
+_workflow_lock = threading.Lock()
+
+def get_workflows():
+    """(workflow, unpaused workflow), built on first use (normally at server startup)."""
+    global _workflows
+    if _workflows is None:
+        with _workflow_lock:
+            if _workflows is None:
+                with startup_phase("build workflow"):
+                    workflow = create_workflow()
+                    # The same graph without the step-by-step interrupts, for multi-step runs
+                    # (an empty invoke-time interrupt_after falls back to the compiled one)
+                    _workflows = workflow, workflow.copy(update={'interrupt_after_nodes': ()})
+    return _workflows
+
+async def aget_workflows():
+    """get_workflows for async code: a first-time build runs off the event loop."""
+    if _workflows is None:
+        return await asyncio.to_thread(get_workflows)
+    return _workflows
+
+# Valid run_until values: any processing node, or END to run the whole workflow
+# (the graph's nodes minus router; kept static so validation needs no built graph)
+STOP_NODES = sorted(
+    ['generate_joke', 'generate_structured', *DETAIL_NODES] + (['join_details'] if GRAPH_MODE == "fanout" else [])
+) + ['END']
+
+def _runner(workflows, run_until):
+    """(graph, interrupt_after) for a run_until value; None keeps one node per call."""
+    workflow, unpaused = workflows
+    if run_until is None:
+        return workflow, None
+    if run_until not in STOP_NODES:
+        raise ValueError(f"run_until must be one of {', '.join(STOP_NODES)}")
+    if GRAPH_MODE == "fanout" and run_until in DETAIL_NODES:
+        # The branches run together, so stopping after one of them means stopping
+        # after the join; before it, next_node/status would still describe the joke
+        run_until = 'join_details'
+    return unpaused, None if run_until == 'END' else [run_until]
+
+def start_joke_generation(topic: str, no_cache: bool = False, run_until: str = None):
     try:
         print(f"Starting joke generation for topic: {topic}")
         
@@ -67,12 +219,14 @@ def start_joke_generation(topic: str):
             'explanation': None,
             'rating': None,
             'alternative': None,
-            'next_node': 'generate_joke',  # Start with joke generation
+            'next_node': FIRST_NODE,  # Start with joke generation (or the structured call)
             'status': 'started'
         }
         
         # Invoke workflow - it will execute first node and interrupt
-        result = workflow.invoke(initial_state)
+        graph, interrupt_after = _runner(get_workflows(), run_until)
+        with request_options(no_cache=no_cache):
+            result = graph.invoke(initial_state, interrupt_after=interrupt_after)
         print(f"First node completed, returning state")
         
         return {
@@ -89,7 +243,7 @@ def start_joke_generation(topic: str):
         raise
 
 
-def continue_workflow(state: dict):
+def continue_workflow(state: dict, no_cache: bool = False, run_until: str = None):
     try:
         next_node = state.get('next_node', 'END')
         print(f"Continuing workflow - routing to: {next_node}")
@@ -103,7 +257,9 @@ def continue_workflow(state: dict):
             }
         
         # Continue workflow with the provided state
-        result = workflow.invoke(state)
+        graph, interrupt_after = _runner(get_workflows(), run_until)
+        with request_options(no_cache=no_cache):
+            result = graph.invoke(state, interrupt_after=interrupt_after)
         print(f"Node {next_node} completed")
         
         return {
@@ -118,3 +274,70 @@ def continue_workflow(state: dict):
     except Exception as e:
         print(f"Error in continue_workflow: {str(e)}")
         raise
+
+
+async def astart_joke_generation(topic: str, no_cache: bool = False, run_until: str = None):
+    """Async version of start_joke_generation."""
+    try:
+        print(f"Starting joke generation for topic: {topic}")
+        
+        initial_state = {
+            'topic': topic,
+            'joke': None,
+            'explanation': None,
+            'rating': None,
+            'alternative': None,
+            'next_node': FIRST_NODE,
+            'status': 'started'
+        }
+        
+        graph, interrupt_after = _runner(await aget_workflows(), run_until)
+        with request_options(no_cache=no_cache):
+            result = await graph.ainvoke(initial_state, interrupt_after=interrupt_after)
+        print(f"First node completed, returning state")
+        
+        return {
+            'topic': result.get('topic'),
+            'joke': result.get('joke'),
+            'explanation': result.get('explanation'),
+            'rating': result.get('rating'),
+            'alternative': result.get('alternative'),
+            'next_node': result.get('next_node'),
+            'status': result.get('status')
+        }
+    except Exception as e:
+        print(f"Error in astart_joke_generation: {str(e)}")
+        raise
+
+
+async def acontinue_workflow(state: dict, no_cache: bool = False, run_until: str = None):
+    """Async version of continue_workflow."""
+    try:
+        next_node = state.get('next_node', 'END')
+        print(f"Continuing workflow - routing to: {next_node}")
+        
+        if next_node == 'END':
+            print("Workflow completed - no more nodes to execute")
+            return {
+                **state,
+                'status': 'completed',
+                'message': 'Workflow completed successfully'
+            }
+        
+        graph, interrupt_after = _runner(await aget_workflows(), run_until)
+        with request_options(no_cache=no_cache):
+            result = await graph.ainvoke(state, interrupt_after=interrupt_after)
+        print(f"Node {next_node} completed")
+        
+        return {
+            'topic': result.get('topic'),
+            'joke': result.get('joke'),
+            'explanation': result.get('explanation'),
+            'rating': result.get('rating'),
+            'alternative': result.get('alternative'),
+            'next_node': result.get('next_node'),
+            'status': result.get('status')
+        }
+    except Exception as e:
+        print(f"Error in acontinue_workflow: {str(e)}")
+        raise
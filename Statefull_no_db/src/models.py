@@ -2,7 +2,9 @@
 Data models and state definitions for the joke generation agent.
 """
 
-from typing import TypedDict, Optional
+import operator
+from typing import TypedDict, Optional, Annotated
+from pydantic import BaseModel, Field
 
 
 class JokeState(TypedDict):
@@ -25,3 +27,16 @@ class JokeState(TypedDict):
     alternative: Optional[str]
     next_node: str
     status: str
+
+
+class FanoutJokeState(JokeState):
+    """JokeState plus the detail branches that failed, collected from parallel branches."""
+    failed_branches: Annotated[list, operator.add]
+
+
+class JokeDetails(BaseModel):
+    """Schema of the single-call structured answer."""
+    joke: str = Field(..., min_length=1)
+    explanation: str = Field(..., min_length=1)
+    rating: str = Field(..., min_length=1)
+    alternative: str = Field(..., min_length=1)
@@ -0,0 +1,126 @@
+"""Compact, signed state tokens for the /continue protocol.
+
+The workflow state is serialized with msgpack, compressed with zstd and
+signed with an HMAC, so clients can send one opaque token back instead of
+every field, and the server can trust its contents without re-validating
+them. Without msgpack/zstandard installed, JSON and zlib are used instead;
+the codec is recorded in the token so either side can decode it.
+
+Token layout (base64url, unpadded):
+    version (1 byte) | codec (1 byte) | payload | HMAC-SHA256 (16 bytes)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Tokens are issued only when a secret is configured; share it across workers
+STATE_TOKEN_SECRET = os.getenv("STATE_TOKEN_SECRET")
+# Reject tokens older than this many seconds; 0 disables the check
+STATE_TOKEN_MAX_AGE = float(os.getenv("STATE_TOKEN_MAX_AGE", "86400"))
+
+TOKEN_VERSION = 1
+MAC_BYTES = 16
+CODEC_MSGPACK = 0x01  # else JSON
+CODEC_ZSTD = 0x02     # else zlib
+
+# Appending fields keeps older tokens decodable (missing trailing fields are absent)
+STATE_FIELDS = ('topic', 'joke', 'explanation', 'rating', 'alternative', 'next_node', 'status', 'version')
+
+
+class InvalidStateToken(ValueError):
+    """Raised for tokens that are malformed, tampered with or expired."""
+
+
+def state_tokens_enabled():
+    return bool(STATE_TOKEN_SECRET)
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _mac(secret, data):
+    return hmac.new(secret.encode(), data, hashlib.sha256).digest()[:MAC_BYTES]
+
+
+def _pack(obj, codec):
+    if codec & CODEC_MSGPACK:
+        raw = msgpack.packb(obj, use_bin_type=True)
+    else:
+        raw = json.dumps(obj, separators=(",", ":")).encode()
+    if codec & CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _unpack(payload, codec):
+    if codec & CODEC_ZSTD:
+        if zstandard is None:
+            raise InvalidStateToken("Token uses zstd, which is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(payload, max_output_size=1 << 20)
+    else:
+        raw = zlib.decompress(payload)
+    if codec & CODEC_MSGPACK:
+        if msgpack is None:
+            raise InvalidStateToken("Token uses msgpack, which is not installed")
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
+
+
+def encode_state(state, secret=None):
+    """Serialize, compress and sign the workflow state fields."""
+    secret = secret or STATE_TOKEN_SECRET
+    codec = (CODEC_MSGPACK if msgpack else 0) | (CODEC_ZSTD if zstandard else 0)
+    # Positional list: no field names in the payload
+    body = [int(time.time())] + [state.get(field) for field in STATE_FIELDS]
+    data = bytes([TOKEN_VERSION, codec]) + _pack(body, codec)
+    return _b64encode(data + _mac(secret, data))
+
+
+def decode_state(token, secret=None, max_age=None):
+    """Verify a token and return the state dict it carries."""
+    secret = secret or STATE_TOKEN_SECRET
+    max_age = STATE_TOKEN_MAX_AGE if max_age is None else max_age
+    try:
+        raw = _b64decode(token)
+    except ValueError as e:
+        raise InvalidStateToken("State token is not valid base64") from e
+    if len(raw) <= 2 + MAC_BYTES:
+        raise InvalidStateToken("State token is too short")
+
+    data, mac = raw[:-MAC_BYTES], raw[-MAC_BYTES:]
+    if not hmac.compare_digest(mac, _mac(secret, data)):
+        raise InvalidStateToken("State token signature does not match")
+    if data[0] != TOKEN_VERSION:
+        raise InvalidStateToken(f"Unsupported state token version: {data[0]}")
+
+    try:
+        body = _unpack(data[2:], data[1])
+    except InvalidStateToken:
+        raise
+    except Exception as e:
+        raise InvalidStateToken(f"State token payload is corrupt: {str(e)}") from e
+
+    issued_at, values = body[0], body[1:]
+    if max_age and time.time() - issued_at > max_age:
+        raise InvalidStateToken("State token has expired")
+    return dict(zip(STATE_FIELDS, values))
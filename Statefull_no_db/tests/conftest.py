@@ -0,0 +1,5 @@
+import os
+
+# Read by src.config at import: run every node against the offline fake model
+os.environ.setdefault("MODEL_NAME", "fake:test")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
@@ -0,0 +1,105 @@
+"""Signed state tokens: round trip, tampering, expiry, codecs and the /continue protocol."""
+
+import base64
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import state_token
+from src.state_token import InvalidStateToken, decode_state, encode_state
+
+SECRET = "test-secret"
+STATE = {
+    'topic': 'cats',
+    'joke': 'Why did the cat sit on the computer? To keep an eye on the mouse.',
+    'explanation': None,
+    'rating': None,
+    'alternative': None,
+    'next_node': 'generate_explanation',
+    'status': 'joke_generated',
+    'version': 1,
+}
+
+
+def _flip_byte(token, index):
+    raw = bytearray(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    raw[index] ^= 0x01
+    return base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode("ascii")
+
+
+def test_round_trip():
+    token = encode_state(STATE, secret=SECRET)
+    assert decode_state(token, secret=SECRET) == STATE
+
+
+@pytest.mark.parametrize("index", [2, 5, -1])
+def test_tampered_token_is_rejected(index):
+    token = encode_state(STATE, secret=SECRET)
+    with pytest.raises(InvalidStateToken):
+        decode_state(_flip_byte(token, index), secret=SECRET)
+
+
+def test_token_signed_with_another_secret_is_rejected():
+    token = encode_state(STATE, secret="other-secret")
+    with pytest.raises(InvalidStateToken, match="signature"):
+        decode_state(token, secret=SECRET)
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token = encode_state(STATE, secret=SECRET)
+    later = time.time() + 120
+    monkeypatch.setattr(state_token.time, 'time', lambda: later)
+    with pytest.raises(InvalidStateToken, match="expired"):
+        decode_state(token, secret=SECRET, max_age=60)
+    assert decode_state(token, secret=SECRET, max_age=0) == STATE
+
+
+@pytest.mark.parametrize("token", ["", "abc", "not base64 !"])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(InvalidStateToken):
+        decode_state(token, secret=SECRET)
+
+
+def test_json_zlib_fallback_codec_is_decodable(monkeypatch):
+    monkeypatch.setattr(state_token, 'msgpack', None)
+    monkeypatch.setattr(state_token, 'zstandard', None)
+    token = encode_state(STATE, secret=SECRET)
+    monkeypatch.undo()
+    assert decode_state(token, secret=SECRET) == STATE
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(state_token, 'STATE_TOKEN_SECRET', SECRET)
+    import api_server
+    with TestClient(api_server.app) as client:
+        yield client
+
+
+def test_continue_accepts_the_token_from_start(client):
+    start = client.post('/start', json={'topic': 'cats'}).json()
+    response = client.post('/continue', json={'state_token': start['state_token'], 'version': 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['state']['explanation']
+    assert body['state']['version'] == 2
+    assert decode_state(body['state_token'])['version'] == 2
+
+
+def test_continue_rejects_plain_fields_when_tokens_are_enabled(client):
+    # Signing them would turn client-supplied text into a trusted token
+    response = client.post('/continue', json={**STATE, 'joke': 'injected'})
+    assert response.status_code == 400
+
+
+def test_continue_rejects_a_tampered_token(client):
+    start = client.post('/start', json={'topic': 'cats'}).json()
+    response = client.post('/continue', json={'state_token': _flip_byte(start['state_token'], 5)})
+    assert response.status_code == 400
+
+
+def test_continue_rejects_a_stale_version(client):
+    start = client.post('/start', json={'topic': 'cats'}).json()
+    response = client.post('/continue', json={'state_token': start['state_token'], 'version': 7})
+    assert response.status_code == 409
@@ -1,29 +1,87 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import uvicorn
-from src.graph import generate_joke_with_explanation
+from src.startup import startup_phase, get_startup_report  # starts the startup clock
+
+with startup_phase("import fastapi"):
+    from fastapi import FastAPI, HTTPException, Response
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import StreamingResponse
+    from pydantic import BaseModel, Field
+    import uvicorn
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import json
+with startup_phase("import src"):
+    from src.graph import (
+        generate_joke_with_explanation, agenerate_joke_with_explanation, astream_joke_with_explanation,
+        agenerate_jokes_batch, BULK_MAX_TOPICS
+    )
+    from src.config import get_llm_stats, ASYNC_EXECUTION, EXECUTION_MODE
+    from src.cache import get_cache_stats
+    from src.breaker import get_breaker_stats
+    from src.llm import get_singleflight_stats, get_limiter_stats, get_hedging_stats
+    from src.topics import get_joke_pool_stats
+
+    from src.readiness import warm_up as readiness_warm_up, is_ready, get_readiness
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so the server accepts connections (and answers
+    # /health) right away; /ready turns 200 when it is done, and requests
+    # arriving meanwhile wait for the workflow
+    warm_up = asyncio.create_task(readiness_warm_up())
+    yield
+    warm_up.cancel()
 
 # Create simple FastAPI app
-app = FastAPI(title="Joke Generation API", version="1.0.0")
+app = FastAPI(title="Joke Generation API", version="1.0.0", lifespan=lifespan)
 
 # Simple request model
 class JokeRequest(BaseModel):
     topic: str
     thread_id: str = "default"
+    no_cache: bool = False
+
+class BulkJokeRequest(BaseModel):
+    topics: List[str] = Field(..., min_length=1, max_length=BULK_MAX_TOPICS)
+    concurrency: Optional[int] = Field(None, ge=1)
+    thread_id: str = "bulk"
+    no_cache: bool = False
 
 @app.get("/")
-def read_root():
-    return {"message": "Joke Generation API is running!", "endpoints": ["/health", "/generate-joke"]}
+async def read_root():
+    return {"message": "Joke Generation API is running!", "endpoints": ["/health", "/ready", "/metrics", "/generate-joke", "/generate-joke/stream", "/generate-jokes"]}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"}
+async def health_check():
+    return {"status": "healthy", "execution_mode": EXECUTION_MODE, "llm_breakers": get_breaker_stats()}
+
+@app.get("/ready")
+async def ready_check(response: Response):
+    # Route traffic on this, not /health: it waits for the LLM client and caches
+    if not is_ready():
+        response.status_code = 503
+    return get_readiness()
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "llm_clients": get_llm_stats(),
+        "llm_cache": get_cache_stats(),
+        "llm_limiter": get_limiter_stats(),
+        "llm_hedging": get_hedging_stats(),
+        "llm_singleflight": get_singleflight_stats(),
+        "joke_pool": get_joke_pool_stats(),
+        "startup": get_startup_report()
+    }
 
 @app.post("/generate-joke")
-def generate_joke_endpoint(request: JokeRequest):
+async def generate_joke_endpoint(request: JokeRequest):
     try:
         print(f"API request for topic: {request.topic}")
-        result = generate_joke_with_explanation(request.topic, request.thread_id)
+        if ASYNC_EXECUTION:
+            result = await agenerate_joke_with_explanation(request.topic, request.thread_id, request.no_cache)
+        else:
+            result = await run_in_threadpool(generate_joke_with_explanation, request.topic, request.thread_id, request.no_cache)
         
         return {
             "topic": request.topic,
@@ -35,6 +93,65 @@ def generate_joke_endpoint(request: JokeRequest):
         print(f"API error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+async def _sse_events(request: JokeRequest):
+    """Frame workflow stream events as Server-Sent Events."""
+    try:
+        yield f"event: start\ndata: {json.dumps({'topic': request.topic, 'thread_id': request.thread_id})}\n\n"
+        async for event, data in astream_joke_with_explanation(request.topic, request.thread_id, request.no_cache):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    except Exception as e:
+        print(f"API error in stream: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'detail': f'Error: {str(e)}'})}\n\n"
+
+def _sse_response(request: JokeRequest):
+    print(f"API stream request for topic: {request.topic}")
+    return StreamingResponse(
+        _sse_events(request),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-joke/stream")
+async def generate_joke_stream_endpoint(request: JokeRequest):
+    return _sse_response(request)
+
+@app.get("/generate-joke/stream")
+async def generate_joke_stream_get_endpoint(topic: str, thread_id: str = "default", no_cache: bool = False):
+    # GET variant for browser EventSource clients
+    return _sse_response(JokeRequest(topic=topic, thread_id=thread_id, no_cache=no_cache))
+
+async def _ndjson_results(request: BulkJokeRequest):
+    """One JSON line per topic, in completion order."""
+    try:
+        async for index, result in agenerate_jokes_batch(
+            request.topics, request.concurrency, request.thread_id, request.no_cache
+        ):
+            item = {"index": index, "topic": request.topics[index], "thread_id": f"{request.thread_id}-{index}"}
+            if isinstance(result, Exception):
+                print(f"Bulk item {index} failed: {str(result)}")
+                item["error"] = f"Error: {str(result)}"
+            elif result.get("error"):
+                # Nodes catch LLM errors and return placeholder text plus the error
+                print(f"Bulk item {index} failed: {result['error']}")
+                item["error"] = f"Error: {result['error']}"
+            else:
+                item["joke"] = result.get("joke", "No joke generated")
+                item["explanation"] = result.get("explanation", "No explanation generated")
+            yield json.dumps(item) + "\n"
+    except Exception as e:
+        print(f"API error in bulk generation: {str(e)}")
+        yield json.dumps({"error": f"Error: {str(e)}"}) + "\n"
+
+@app.post("/generate-jokes")
+async def generate_jokes_endpoint(request: BulkJokeRequest):
+    print(f"API bulk request for {len(request.topics)} topics")
+    return StreamingResponse(
+        _ndjson_results(request),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
 # if __name__ == "__main__":
 #     print("Starting Joke Generation API server on port 8000...")
 #     print("Endpoints available:")
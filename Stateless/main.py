@@ -4,87 +4,204 @@ Main application entry point for the joke generation agent.
 
 import logging
 import argparse
+import contextlib
+import json
+import os
 import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import Optional
-from src.config import config
-from src.graph import joke_workflow
+from src.graph import get_workflow, generate_joke_with_explanation
 
 
-def setup_logging():
+def setup_logging(debug: bool = False):
     """Configure logging for the application."""
     logging.basicConfig(
-        level=getattr(logging, config.log_level.upper()),
+        level=logging.DEBUG if debug else logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.StreamHandler(sys.stdout),
+            logging.StreamHandler(sys.stderr),
             logging.FileHandler('joke_agent.log')
         ]
     )
 
 
-def generate_joke_interactive():
+def generate_joke_interactive(thread_id: str = "interactive"):
     """Interactive mode for generating jokes."""
     print("🎭 Welcome to the Joke Generation Agent!")
     print("Type 'quit' to exit\n")
-    
+
     while True:
         topic = input("Enter a topic for the joke: ").strip()
-        
+
         if topic.lower() in ['quit', 'exit', 'q']:
             print("Goodbye! 👋")
             break
-        
+
         if not topic:
             print("Please enter a valid topic.\n")
             continue
-        
+
         try:
             print(f"\n🤔 Generating joke about '{topic}'...")
-            result = joke_workflow.invoke(topic, thread_id="interactive")
-            
+            result = generate_joke_with_explanation(topic, thread_id=thread_id)
+
             print(f"\n😄 **Joke:** {result['joke']}")
             print(f"\n💡 **Explanation:** {result['explanation']}")
             print("-" * 80)
-            
+
         except Exception as e:
             print(f"❌ Error generating joke: {str(e)}")
-        
+
         print()
 
 
-def generate_joke_batch(topics: list, output_file: Optional[str] = None):
-    """Batch mode for generating jokes for multiple topics."""
-    results = []
-    
-    for i, topic in enumerate(topics, 1):
-        try:
-            print(f"Processing {i}/{len(topics)}: {topic}")
-            result = joke_workflow.invoke(topic, thread_id=f"batch_{i}")
-            results.append({
-                'topic': topic,
-                'joke': result['joke'],
-                'explanation': result['explanation']
-            })
-        except Exception as e:
-            print(f"Error processing '{topic}': {str(e)}")
-            results.append({
+def iter_topics(topics: Optional[list] = None, topics_file: Optional[str] = None):
+    """Yield (index, topic) lazily from a list, a file or stdin ('-')."""
+    if topics:
+        yield from enumerate(topics)
+        return
+
+    stream = sys.stdin if topics_file == '-' else open(topics_file, encoding='utf-8')
+    try:
+        index = 0
+        for line in stream:
+            topic = line.strip()
+            if topic:
+                yield index, topic
+                index += 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def load_checkpoint(path: Optional[str]) -> set:
+    """Indices already written by a previous (possibly crashed) run."""
+    if not path or not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.isdigit():
+                done.add(int(line))
+    return done
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def _run_one(index: int, topic: str, thread_prefix: str):
+    """Generate one result, dropping its in-memory checkpoints afterwards."""
+    thread_id = f"{thread_prefix}_{index}"
+    started = time.perf_counter()
+    try:
+        result = generate_joke_with_explanation(topic, thread_id=thread_id)
+        if result.get('error'):
+            # A node fell back to its "Sorry" placeholder
+            record = {'index': index, 'topic': topic, 'error': result['error']}
+        else:
+            record = {
+                'index': index,
                 'topic': topic,
-                'joke': f"Error: {str(e)}",
-                'explanation': "N/A"
-            })
-    
-    # Output results
+                'joke': result.get('joke'),
+                'explanation': result.get('explanation')
+            }
+    except Exception as e:
+        record = {'index': index, 'topic': topic, 'error': str(e)}
+    finally:
+        get_workflow().checkpointer.delete_thread(thread_id)
+    return record, time.perf_counter() - started
+
+
+def generate_joke_batch(topics: Optional[list] = None, topics_file: Optional[str] = None,
+                        output_file: Optional[str] = None, concurrency: int = 4,
+                        checkpoint_file: Optional[str] = None, resume: bool = True,
+                        thread_prefix: str = "batch"):
+    """Batch mode: run topics through a worker pool, appending JSONL as results complete.
+
+    Completed indices are appended to the checkpoint file right after their
+    result is written, so a crashed run restarted with the same arguments
+    skips everything already done. Failed topics are written with an "error"
+    key but not checkpointed, so a resumed run retries them. Without an output file the JSONL goes to
+    stdout, and progress printed by the workflow goes to stderr.
+    """
+    logger = logging.getLogger(__name__)
+    if output_file and not checkpoint_file:
+        checkpoint_file = f"{output_file}.ckpt"
+
+    done = load_checkpoint(checkpoint_file) if resume else set()
+    if done:
+        logger.info(f"Resuming: {len(done)} topics already completed")
+
+    out = open(output_file, 'a' if resume else 'w', encoding='utf-8') if output_file else sys.stdout
+    ckpt = open(checkpoint_file, 'a' if resume else 'w', encoding='utf-8') if checkpoint_file else None
+    write_lock = threading.Lock()
+
+    latencies = []
+    counts = {'ok': 0, 'error': 0, 'skipped': 0}
+    started = time.perf_counter()
+
+    def record_result(future):
+        record, latency = future.result()
+        with write_lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            if ckpt and 'error' not in record:
+                ckpt.write(f"{record['index']}\n")
+                ckpt.flush()
+            latencies.append(latency)
+            counts['error' if 'error' in record else 'ok'] += 1
+            finished = counts['ok'] + counts['error']
+            if finished % 100 == 0:
+                rate = finished / (time.perf_counter() - started)
+                logger.info(f"Completed {finished} topics ({rate:.1f} topics/s)")
+
+    # Node and client print() calls would otherwise interleave with the JSONL
+    # (redirect_stdout swaps sys.stdout process-wide, so worker threads follow)
+    try:
+        with contextlib.redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = set()
+            for index, topic in iter_topics(topics, topics_file):
+                if index in done:
+                    counts['skipped'] += 1
+                    continue
+                # Bound in-flight work so huge inputs are streamed, not buffered
+                if len(pending) >= concurrency * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record_result(future)
+                pending.add(executor.submit(_run_one, index, topic, thread_prefix))
+
+            for future in wait(pending).done:
+                record_result(future)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if ckpt:
+            ckpt.close()
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    processed = counts['ok'] + counts['error']
+    summary = {
+        **counts,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_per_s': round(processed / elapsed, 2) if elapsed else 0.0,
+        'latency_p50_s': round(_percentile(latencies, 50), 3),
+        'latency_p90_s': round(_percentile(latencies, 90), 3),
+        'latency_p99_s': round(_percentile(latencies, 99), 3),
+        'latency_max_s': round(latencies[-1], 3) if latencies else 0.0,
+    }
+    print(f"Batch summary: {json.dumps(summary)}", file=sys.stderr)
     if output_file:
-        import json
-        with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2)
-        print(f"Results saved to {output_file}")
-    else:
-        for result in results:
-            print(f"\nTopic: {result['topic']}")
-            print(f"Joke: {result['joke']}")
-            print(f"Explanation: {result['explanation']}")
-            print("-" * 80)
+        print(f"Results appended to {output_file}", file=sys.stderr)
+    return summary
 
 
 def main():
@@ -93,76 +210,99 @@ def main():
         description="Joke Generation Agent - AI-powered joke creation and explanation"
     )
     parser.add_argument(
-        '--mode', 
-        choices=['interactive', 'batch', 'single'], 
+        '--mode',
+        choices=['interactive', 'batch', 'single'],
         default='interactive',
         help='Operation mode (default: interactive)'
     )
     parser.add_argument(
-        '--topic', 
+        '--topic',
         type=str,
         help='Topic for joke generation (required for single mode)'
     )
     parser.add_argument(
-        '--topics', 
+        '--topics',
         nargs='+',
         help='Multiple topics for batch mode'
     )
     parser.add_argument(
-        '--output', 
+        '--topics-file',
+        type=str,
+        help="File with one topic per line for batch mode ('-' reads stdin)"
+    )
+    parser.add_argument(
+        '--output',
         type=str,
-        help='Output file for batch mode results (JSON format)'
+        help='Output file for batch mode results (JSONL, appended as results complete)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='Number of topics processed in parallel in batch mode (default: 4)'
     )
     parser.add_argument(
-        '--thread-id', 
-        type=str, 
+        '--checkpoint',
+        type=str,
+        help='Progress file for resuming batch mode (default: <output>.ckpt)'
+    )
+    parser.add_argument(
+        '--no-resume',
+        action='store_true',
+        help='Ignore and overwrite previous batch progress'
+    )
+    parser.add_argument(
+        '--thread-id',
+        type=str,
         default='main',
         help='Thread ID for session management'
     )
     parser.add_argument(
-        '--debug', 
+        '--debug',
         action='store_true',
         help='Enable debug logging'
     )
-    
+
     args = parser.parse_args()
-    
-    # Override config with command line arguments
-    if args.debug:
-        config.debug = True
-        config.log_level = "DEBUG"
-    
+
     # Setup logging
-    setup_logging()
+    setup_logging(args.debug)
     logger = logging.getLogger(__name__)
-    
+
     try:
-        # Validate configuration
-        config.validate()
-        logger.info("Configuration validated successfully")
-        
         # Run based on mode
         if args.mode == 'interactive':
-            generate_joke_interactive()
-            
+            generate_joke_interactive(args.thread_id)
+
         elif args.mode == 'single':
             if not args.topic:
                 print("Error: --topic is required for single mode")
                 sys.exit(1)
-            
+
             print(f"Generating joke for topic: {args.topic}")
-            result = joke_workflow.invoke(args.topic, thread_id=args.thread_id)
-            
+            result = generate_joke_with_explanation(args.topic, thread_id=args.thread_id)
+
             print(f"\n😄 **Joke:** {result['joke']}")
             print(f"\n💡 **Explanation:** {result['explanation']}")
-            
+
         elif args.mode == 'batch':
-            if not args.topics:
-                print("Error: --topics is required for batch mode")
+            if not args.topics and not args.topics_file:
+                print("Error: --topics or --topics-file is required for batch mode")
                 sys.exit(1)
-            
-            generate_joke_batch(args.topics, args.output)
-            
+            if args.concurrency < 1:
+                print("Error: --concurrency must be at least 1")
+                sys.exit(1)
+
+            generate_joke_batch(
+                topics=args.topics,
+                topics_file=args.topics_file,
+                output_file=args.output,
+                concurrency=args.concurrency,
+                checkpoint_file=args.checkpoint,
+                resume=not args.no_resume,
+                thread_prefix=args.thread_id
+            )
+
     except Exception as e:
         logger.error(f"Application error: {str(e)}")
         print(f"❌ Error: {str(e)}")
@@ -0,0 +1,250 @@
+"""Two-tier LLM response cache: in-memory LRU in front of a shared SQLite file."""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+# Empty path keeps the cache in memory only
+LLM_CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "llm_cache.db")
+# Most recent disk entries copied into memory during startup warm-up; 0 disables
+LLM_CACHE_PRELOAD = int(os.getenv("LLM_CACHE_PRELOAD", "1000"))
+
+
+def cache_key(model, settings, prompt):
+    """Stable key for a (model, generation settings, prompt) triple."""
+    raw = json.dumps([model, sorted(settings.items()), prompt], default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class MemoryLRU:
+    """Thread-safe LRU bounded by total value size in bytes, with per-entry TTL."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, expires_at=None):
+        size = len(key) + len(value.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, expires_at or time.time() + self.ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class SQLiteStore:
+    """On-disk tier shared between uvicorn workers through one WAL-mode file."""
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._puts = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not thread-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row
+
+    def put(self, key, value):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + self.ttl),
+        )
+        self._puts += 1
+        if self._puts % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def recent(self, limit):
+        """Up to limit unexpired (key, value, expires_at) rows, oldest first."""
+        rows = self._connect().execute(
+            "SELECT key, value, expires_at FROM llm_cache WHERE expires_at > ? "
+            "ORDER BY expires_at DESC LIMIT ?",
+            (time.time(), limit),
+        ).fetchall()
+        return rows[::-1]
+
+    def stats(self):
+        count = self._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {'path': self.path, 'entries': count}
+
+
+class ResponseCache:
+    """Memory LRU backed by an optional SQLite store, with hit/miss counters."""
+
+    def __init__(self, max_bytes=LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL, db_path=LLM_CACHE_DB_PATH):
+        self.memory = MemoryLRU(max_bytes, ttl)
+        self.disk = SQLiteStore(db_path, ttl) if db_path else None
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0, 'disk_errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        return self._load(key)
+
+    async def aget(self, key):
+        """Like get, but reads the disk tier off the event loop."""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+        if self.disk is None:
+            return self._load(key)
+        return await asyncio.to_thread(self._load, key)
+
+    def _load(self, key):
+        if self.disk is not None:
+            try:
+                row = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"LLM cache disk read failed: {str(e)}")
+                self._count('disk_errors')
+                row = None
+            if row is not None:
+                self._count('disk_hits')
+                self.memory.put(key, row[0], expires_at=row[1])
+                return row[0]
+
+        self._count('misses')
+        return None
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        self._store(key, value)
+
+    async def aput(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._store, key, value)
+
+    def _store(self, key, value):
+        if self.disk is not None:
+            try:
+                self.disk.put(key, value)
+            except sqlite3.Error as e:
+                print(f"LLM cache disk write failed: {str(e)}")
+                self._count('disk_errors')
+
+    def preload(self, limit=LLM_CACHE_PRELOAD):
+        """Copy the most recent disk entries into memory; returns how many."""
+        if self.disk is None or limit <= 0:
+            return 0
+        rows = self.disk.recent(limit)
+        # Oldest first, so the LRU keeps the newest if they do not all fit
+        for key, value, expires_at in rows:
+            self.memory.put(key, value, expires_at=expires_at)
+        return len(rows)
+
+    def record_bypass(self):
+        self._count('bypassed')
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters['memory_hits'] + counters['disk_hits']
+        lookups = hits + counters['misses']
+        stats = {
+            'enabled': True,
+            **counters,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'memory': self.memory.stats(),
+        }
+        if self.disk is not None:
+            try:
+                stats['disk'] = self.disk.stats()
+            except sqlite3.Error as e:
+                stats['disk'] = {'path': self.disk.path, 'error': str(e)}
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+                print(f"LLM response cache initialized (disk: {LLM_CACHE_DB_PATH or 'disabled'})")
+    return _cache
+
+
+def get_cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {'enabled': False}
@@ -1,22 +1,220 @@
 """Simple configuration for the joke agent."""
 
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from .startup import startup_phase
 
 # Load environment variables
 load_dotenv()
 
 # Simple configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# "<backend>:<model>" selects a registered backend, e.g. "fake:gemini-sim"
 MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash")
+DEFAULT_LLM_BACKEND = os.getenv("LLM_BACKEND", "google")
+# Cheaper/faster model used while MODEL_NAME's circuit breaker is open
+FALLBACK_MODEL_NAME = os.getenv("FALLBACK_MODEL_NAME") or None
 
-def get_llm():
-    """Get the language model."""
+# "sync" runs workflows in the server threadpool, "async" awaits them on the event loop
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "sync").lower()
+ASYNC_EXECUTION = EXECUTION_MODE == "async"
+
+# HTTP connection pool shared by every call made through a pooled client
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# One client per (model, generation settings), shared across threads
+_clients = {}
+_clients_lock = threading.Lock()
+_client_stats = {'created': 0, 'reused': 0}
+# HTTP requests sent through pooled clients, and the connections/TLS handshakes they opened
+_connection_stats = {'requests': 0, 'connections_opened': 0, 'tls_handshakes': 0}
+
+
+def _count_connection_event(name):
+    # httpcore trace events: only a new connection runs connect_tcp and start_tls
+    if name == 'connection.connect_tcp.complete':
+        key = 'connections_opened'
+    elif name == 'connection.start_tls.complete':
+        key = 'tls_handshakes'
+    else:
+        return
+    with _clients_lock:
+        _connection_stats[key] += 1
+
+
+async def _acount_connection_event(name, info):
+    _count_connection_event(name)
+
+
+class CountingTransport:
+    """httpx transport for both the sync and async client of one LLM client.
+
+    Wraps keep-alive pooled transports and traces every request, so new
+    connections and TLS handshakes can be counted against requests.
+    """
+
+    def __init__(self, limits):
+        import httpx
+        self._transport = httpx.HTTPTransport(limits=limits)
+        self._async_transport = httpx.AsyncHTTPTransport(limits=limits)
+
+    def _count_request(self, request, trace):
+        with _clients_lock:
+            _connection_stats['requests'] += 1
+        request.extensions = {**request.extensions, 'trace': trace}
+
+    def handle_request(self, request):
+        self._count_request(request, lambda name, info: _count_connection_event(name))
+        return self._transport.handle_request(request)
+
+    async def handle_async_request(self, request):
+        self._count_request(request, _acount_connection_event)
+        return await self._async_transport.handle_async_request(request)
+
+    def __enter__(self):
+        self._transport.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._transport.__exit__(*exc_info)
+
+    async def __aenter__(self):
+        await self._async_transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._async_transport.__aexit__(*exc_info)
+
+    def close(self):
+        self._transport.close()
+
+    async def aclose(self):
+        await self._async_transport.aclose()
+
+
+def _client_args():
+    """httpx client arguments for a keep-alive connection pool.
+
+    The pool limits live on the transport, which counts the connections it opens.
+    """
+    import httpx
+    return {
+        'transport': CountingTransport(httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+        )),
+    }
+
+
+def _build_google(model, **settings):
+    """Gemini chat model with a keep-alive connection pool."""
     if not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY environment variable is required")
-    
+    # Deferred: the Gemini SDK takes ~0.6s to import, paid on first client creation
+    with startup_phase("import langchain_google_genai"):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
     return ChatGoogleGenerativeAI(
-        model=MODEL_NAME,
-        google_api_key=GOOGLE_API_KEY
+        model=model,
+        google_api_key=GOOGLE_API_KEY,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        client_args=_client_args(),
+        **settings
     )
+
+
+def _build_fake(model, **settings):
+    """Offline fake chat model configured from FAKE_LLM_* variables."""
+    from .fake_llm import FakeChatModel
+    return FakeChatModel.from_env(model=model, **settings)
+
+
+# Backend name -> builder(model, **settings)
+LLM_BACKENDS = {
+    'google': _build_google,
+    'fake': _build_fake,
+}
+
+
+def register_backend(name, builder):
+    """Register a chat model builder selectable as "<name>:<model>"."""
+    LLM_BACKENDS[name] = builder
+
+
+def resolve_backend(model):
+    """Split a model spec into (backend, model name)."""
+    backend, sep, name = model.partition(":")
+    if sep and backend in LLM_BACKENDS:
+        return backend, name or backend
+    return DEFAULT_LLM_BACKEND, model
+
+
+def get_llm(model=None, **settings):
+    """Get the pooled language model for a model and its generation settings.
+
+    Clients are built once per (model, settings) key and reused, so repeated
+    node calls share the same transport and TLS sessions instead of paying a
+    fresh handshake on every execution.
+    """
+    model = model or MODEL_NAME
+    key = (model, tuple(sorted(settings.items())))
+
+    llm = _clients.get(key)
+    if llm is not None:
+        with _clients_lock:
+            _client_stats['reused'] += 1
+        return llm
+
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is not None:
+            _client_stats['reused'] += 1
+            return llm
+
+        backend, name = resolve_backend(model)
+        if backend not in LLM_BACKENDS:
+            raise ValueError(f"Unknown LLM backend: {backend}")
+
+        print(f"Creating pooled LLM client for model: {name} (backend: {backend})")
+        llm = LLM_BACKENDS[backend](name, **settings)
+        _clients[key] = llm
+        _client_stats['created'] += 1
+        return llm
+
+
+def get_llm_stats():
+    """Report client reuse, and how many HTTP requests reused a pooled connection."""
+    with _clients_lock:
+        total = _client_stats['created'] + _client_stats['reused']
+        requests = _connection_stats['requests']
+        reused = max(0, requests - _connection_stats['connections_opened'])
+        return {
+            'clients': len(_clients),
+            'created': _client_stats['created'],
+            'reused': _client_stats['reused'],
+            'reuse_ratio': round(_client_stats['reused'] / total, 4) if total else 0.0,
+            'connections': {
+                **_connection_stats,
+                'requests_on_reused_connections': reused,
+                'connection_reuse_ratio': round(reused / requests, 4) if requests else 0.0,
+            },
+            'pool': {
+                'max_connections': LLM_POOL_MAX_CONNECTIONS,
+                'max_keepalive': LLM_POOL_MAX_KEEPALIVE,
+                'keepalive_expiry': LLM_POOL_KEEPALIVE_EXPIRY,
+                'timeout': LLM_TIMEOUT,
+            },
+        }
+
+
+def reset_llm_clients():
+    """Drop every pooled client (e.g. on shutdown or after a key rotation)."""
+    with _clients_lock:
+        _clients.clear()
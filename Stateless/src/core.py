@@ -1,38 +1,158 @@
 """Simple joke generation functions."""
 
-from .config import get_llm
+from pydantic import ValidationError
+from .llm import complete, acomplete, cache_bypassed
+from .models import JokeWithExplanation
+from .topics import get_joke_pool
+
+STRUCTURED_PROMPT = (
+    'Generate a funny joke and explain why it is funny. Respond with only a JSON object '
+    'with the keys "joke" and "explanation". Topic: {topic}'
+)
+
+
+def _pooled_topic(topic):
+    """Canonical topic and its joke pool, or (topic, None) when pooling is off."""
+    pool = get_joke_pool()
+    if pool is None or cache_bypassed():
+        return topic, None
+    return pool.canonicalize(topic), pool
 
 def generate_joke(state):
     """Generate a joke based on the topic."""
     try:
-        llm = get_llm()
         topic = state.get("topic", "general")
-        prompt = f'Generate a funny joke about {topic}'
+        canonical, pool = _pooled_topic(topic)
+        if pool is not None:
+            cached = pool.sample(canonical)
+            if cached is not None:
+                print(f"Serving pooled joke for topic: {canonical}")
+                return {'joke': cached}
+        prompt = f'Generate a funny joke about {canonical}'
         
         print(f"Generating joke for topic: {topic}")
-        response = llm.invoke(prompt).content
+        response = complete(prompt, use_cache=pool is None)
         print("Joke generated successfully")
         
+        if pool is not None:
+            pool.add(canonical, response)
         return {'joke': response}
         
     except Exception as e:
         print(f"Error generating joke: {str(e)}")
-        return {'joke': f"Sorry, I couldn't generate a joke about {topic} right now."}
+        return {'joke': f"Sorry, I couldn't generate a joke about {topic} right now.", 'error': str(e)}
 
 
 def generate_explanation(state):
     """Generate an explanation for the joke."""
     try:
-        llm = get_llm()
         joke = state.get("joke", "")
         prompt = f'Explain why this joke is funny: {joke}'
         
         print("Generating explanation for joke")
-        response = llm.invoke(prompt).content
+        response = complete(prompt)
         print("Explanation generated successfully")
         
         return {'explanation': response}
         
     except Exception as e:
         print(f"Error generating explanation: {str(e)}")
-        return {'explanation': "Sorry, I couldn't generate an explanation for this joke."}
+        return {'explanation': "Sorry, I couldn't generate an explanation for this joke.", 'error': str(e)}
+
+
+async def agenerate_joke(state):
+    """Async variant of generate_joke for the async execution path."""
+    try:
+        topic = state.get("topic", "general")
+        canonical, pool = _pooled_topic(topic)
+        if pool is not None:
+            cached = pool.sample(canonical)
+            if cached is not None:
+                print(f"Serving pooled joke for topic: {canonical}")
+                return {'joke': cached}
+        prompt = f'Generate a funny joke about {canonical}'
+        
+        print(f"Generating joke for topic: {topic}")
+        response = await acomplete(prompt, use_cache=pool is None)
+        print("Joke generated successfully")
+        
+        if pool is not None:
+            pool.add(canonical, response)
+        return {'joke': response}
+        
+    except Exception as e:
+        print(f"Error generating joke: {str(e)}")
+        return {'joke': f"Sorry, I couldn't generate a joke about {topic} right now.", 'error': str(e)}
+
+
+async def agenerate_explanation(state):
+    """Async variant of generate_explanation for the async execution path."""
+    try:
+        joke = state.get("joke", "")
+        prompt = f'Explain why this joke is funny: {joke}'
+        
+        print("Generating explanation for joke")
+        response = await acomplete(prompt)
+        print("Explanation generated successfully")
+        
+        return {'explanation': response}
+        
+    except Exception as e:
+        print(f"Error generating explanation: {str(e)}")
+        return {'explanation': "Sorry, I couldn't generate an explanation for this joke.", 'error': str(e)}
+
+
+def parse_structured(text, schema):
+    """Validate a JSON answer (optionally wrapped in a code fence) against a schema.
+
+    Returns the validated fields as a dict, or None when the answer is not
+    valid JSON for the schema.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        return schema.model_validate_json(text[start:end + 1]).model_dump()
+    except ValidationError:
+        return None
+
+
+def generate_structured(state):
+    """Generate joke and explanation with one structured call.
+
+    Returns empty fields when the answer does not parse (clearing any answer
+    left on a reused thread), so the graph falls back to the
+    generate_joke -> generate_explanation path.
+    """
+    try:
+        topic = state.get("topic", "general")
+        print(f"Generating structured joke for topic: {topic}")
+        response = complete(STRUCTURED_PROMPT.format(topic=topic))
+        parsed = parse_structured(response, JokeWithExplanation)
+        if parsed is None:
+            print("Structured answer did not match the schema, falling back to two calls")
+            return {'joke': "", 'explanation': ""}
+        print("Structured joke generated successfully")
+        return parsed
+
+    except Exception as e:
+        print(f"Error generating structured joke: {str(e)}")
+        return {'joke': "", 'explanation': ""}
+
+
+async def agenerate_structured(state):
+    """Async variant of generate_structured for the async execution path."""
+    try:
+        topic = state.get("topic", "general")
+        print(f"Generating structured joke for topic: {topic}")
+        response = await acomplete(STRUCTURED_PROMPT.format(topic=topic))
+        parsed = parse_structured(response, JokeWithExplanation)
+        if parsed is None:
+            print("Structured answer did not match the schema, falling back to two calls")
+            return {'joke': "", 'explanation': ""}
+        print("Structured joke generated successfully")
+        return parsed
+
+    except Exception as e:
+        print(f"Error generating structured joke: {str(e)}")
+        return {'joke': "", 'explanation': ""}
@@ -1,24 +1,50 @@
 """Simple workflow for joke generation."""
 
-from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import InMemorySaver
+import asyncio
+import os
+import threading
+
+from langgraph.constants import START, END
 from .models import JokeState
-from .core import generate_joke, generate_explanation
+from .core import (
+    generate_joke, generate_explanation, generate_structured,
+    agenerate_joke, agenerate_explanation, agenerate_structured
+)
+from .llm import request_options
+from .startup import startup_phase
+
+# "two_step" calls the model for the joke, then for the explanation;
+# "structured" asks once for both as JSON and falls back to two_step on parse failure
+WORKFLOW_MODE = os.getenv("WORKFLOW_MODE", "two_step").lower()
+
+def route_after_structured(state):
+    """Finish when the structured call produced both fields, else run the two nodes."""
+    return END if state.get('joke') and state.get('explanation') else 'generate_joke'
 
 # Create simple workflow
 def create_workflow():
     """Create and return the joke workflow."""
-    print("Setting up joke generation workflow")
+    print(f"Setting up joke generation workflow (mode: {WORKFLOW_MODE})")
+    # Deferred until the workflow is built: langgraph takes ~0.6s to import
+    with startup_phase("import langgraph"):
+        from langgraph.graph import StateGraph
+        from langgraph.checkpoint.memory import InMemorySaver
+        from langchain_core.runnables import RunnableLambda
     
     # Create the state graph
     graph = StateGraph(JokeState)
     
-    # Add nodes
-    graph.add_node('generate_joke', generate_joke)
-    graph.add_node('generate_explanation', generate_explanation)
+    # Add nodes (sync function for invoke, async function for ainvoke)
+    graph.add_node('generate_joke', RunnableLambda(generate_joke, afunc=agenerate_joke, name='generate_joke'))
+    graph.add_node('generate_explanation', RunnableLambda(generate_explanation, afunc=agenerate_explanation, name='generate_explanation'))
     
     # Add edges
-    graph.add_edge(START, 'generate_joke')
+    if WORKFLOW_MODE == "structured":
+        graph.add_node('generate_structured', RunnableLambda(generate_structured, afunc=agenerate_structured, name='generate_structured'))
+        graph.add_edge(START, 'generate_structured')
+        graph.add_conditional_edges('generate_structured', route_after_structured, ['generate_joke', END])
+    else:
+        graph.add_edge(START, 'generate_joke')
     graph.add_edge('generate_joke', 'generate_explanation')
     graph.add_edge('generate_explanation', END)
     
@@ -31,15 +57,60 @@ def create_workflow():
     
     return workflow
 
-# Create global workflow instance
-workflow = create_workflow()
+_workflow = None
+_workflow_lock = threading.Lock()
+
+
+def get_workflow():
+    """The compiled workflow, built on first use (normally at server startup)."""
+    global _workflow
+    if _workflow is None:
+        with _workflow_lock:
+            if _workflow is None:
+                with startup_phase("build workflow"):
+                    _workflow = create_workflow()
+    return _workflow
+
+
+async def aget_workflow():
+    """get_workflow for async code: a first-time build runs off the event loop."""
+    if _workflow is None:
+        return await asyncio.to_thread(get_workflow)
+    return _workflow
+
+
+def _input(topic):
+    # Threads are reused across requests; clear a previous run's error marker
+    return {'topic': topic, 'error': None}
+
 
-def generate_joke_with_explanation(topic, thread_id="default"):
+def generate_joke_with_explanation(topic, thread_id="default", no_cache=False):
     """Simple function to generate joke and explanation."""
     try:
         config = {"configurable": {"thread_id": thread_id}}
         print(f"Generating joke for topic: {topic}")
-        result = workflow.invoke({'topic': topic}, config=config)
+        with request_options(no_cache=no_cache):
+            result = get_workflow().invoke(_input(topic), config=config)
+        print("Workflow completed successfully")
+        return result
+    except Exception as e:
+        print(f"Error in workflow: {str(e)}")
+        return {
+            'topic': topic,
+            'joke': f"Sorry, couldn't generate joke about {topic}",
+            'explanation': "Error occurred during generation",
+            'error': str(e)
+        }
+
+
+async def agenerate_joke_with_explanation(topic, thread_id="default", no_cache=False):
+    """Async version of generate_joke_with_explanation."""
+    try:
+        config = {"configurable": {"thread_id": thread_id}}
+        print(f"Generating joke for topic: {topic}")
+        with request_options(no_cache=no_cache):
+            workflow = await aget_workflow()
+            result = await workflow.ainvoke(_input(topic), config=config)
         print("Workflow completed successfully")
         return result
     except Exception as e:
@@ -47,5 +118,105 @@ def generate_joke_with_explanation(topic, thread_id="default"):
         return {
             'topic': topic,
             'joke': f"Sorry, couldn't generate joke about {topic}",
-            'explanation': "Error occurred during generation"
+            'explanation': "Error occurred during generation",
+            'error': str(e)
         }
+
+
+# Bulk generation limits
+BULK_MAX_TOPICS = int(os.getenv("BULK_MAX_TOPICS", "1000"))
+BULK_DEFAULT_CONCURRENCY = int(os.getenv("BULK_DEFAULT_CONCURRENCY", "8"))
+BULK_MAX_CONCURRENCY = int(os.getenv("BULK_MAX_CONCURRENCY", "64"))
+
+
+async def agenerate_jokes_batch(topics, concurrency=None, thread_id="bulk", no_cache=False):
+    """Run the workflow for many topics, yielding (index, result) as each finishes.
+
+    At most `concurrency` topics are in flight. A failed item yields its
+    exception as the result instead of failing the batch. Each item's thread
+    is dropped from the in-memory checkpointer once it has been yielded, and
+    closing the generator (a disconnected client) cancels what is left.
+    """
+    concurrency = max(1, min(concurrency or BULK_DEFAULT_CONCURRENCY, BULK_MAX_CONCURRENCY))
+    print(f"Generating jokes for {len(topics)} topics (concurrency: {concurrency})")
+
+    workflow = await aget_workflow()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, topic):
+        async with semaphore:
+            config = {"configurable": {"thread_id": f"{thread_id}-{index}"}}
+            try:
+                return index, await workflow.ainvoke(_input(topic), config=config)
+            except Exception as e:
+                return index, e
+
+    # Tasks copy the current context, so they keep the request options
+    with request_options(no_cache=no_cache):
+        tasks = [asyncio.create_task(run(index, topic)) for index, topic in enumerate(topics)]
+    remaining = set(range(len(topics)))
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result = await next_done
+            yield index, result
+            await workflow.checkpointer.adelete_thread(f"{thread_id}-{index}")
+            remaining.discard(index)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for index in remaining:
+            await workflow.checkpointer.adelete_thread(f"{thread_id}-{index}")
+
+
+# Node -> state field it produces, in execution order
+STREAMED_FIELDS = {'generate_joke': 'joke', 'generate_explanation': 'explanation'}
+
+
+async def astream_joke_with_explanation(topic, thread_id="default", no_cache=False):
+    """Stream joke and explanation tokens as (event, data) pairs.
+
+    Tokens come from the model's streaming API through LangGraph's "messages"
+    stream mode. Nodes answered without calling the model (cache or joke pool
+    hits) produce no tokens, so their full text is sent as a single token. A
+    structured answer is JSON, so each of its fields is sent as a single token
+    under the node that would otherwise have produced it.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    result = {'topic': topic}
+    streamed = set()
+    print(f"Streaming joke for topic: {topic}")
+
+    workflow = await aget_workflow()
+    # No hedging: a duplicate request would interleave its tokens into the stream
+    with request_options(no_cache=no_cache, hedge=False):
+        async for mode, item in workflow.astream(
+            _input(topic), config=config, stream_mode=["messages", "updates"]
+        ):
+            if mode == "messages":
+                chunk, metadata = item
+                node = metadata.get('langgraph_node')
+                if node in STREAMED_FIELDS and chunk.content:
+                    streamed.add(node)
+                    yield 'token', {'node': node, 'text': chunk.content}
+                continue
+
+            for node, update in item.items():
+                if node == 'generate_structured':
+                    for field_node, field in STREAMED_FIELDS.items():
+                        if (update or {}).get(field):
+                            result[field] = update[field]
+                            yield 'token', {'node': field_node, 'text': update[field]}
+                            yield 'node_end', {'node': field_node, field: update[field]}
+                    continue
+                if node not in STREAMED_FIELDS:
+                    continue
+                field = STREAMED_FIELDS[node]
+                value = (update or {}).get(field, "")
+                result[field] = value
+                if node not in streamed:
+                    yield 'token', {'node': node, 'text': value}
+                yield 'node_end', {'node': node, field: value}
+
+    print("Streaming workflow completed")
+    yield 'done', {**result, 'thread_id': thread_id}
@@ -0,0 +1,215 @@
+"""Hedged (speculative duplicate) LLM requests to cut tail latency.
+
+If a call has not returned by a percentile of recently observed latency, an
+identical second request is issued and whichever succeeds first wins; the
+loser is cancelled (async) or abandoned (sync). Hedges are capped by a budget
+expressed as a fraction of all requests, and the caller can refuse a hedge
+(e.g. when no concurrency slot is free for it).
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .limiter import LLM_LIMITER_MAX
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Never hedge earlier than this, nor before enough latencies were observed
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "500"))
+# Maximum extra requests as a fraction of all requests
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+# Threads for sync-mode hedging. Primaries and hedges each hold their own
+# limiter slot, so the default (0) fits all of them without queueing
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "0")) or int(LLM_LIMITER_MAX)
+
+
+class Hedger:
+    """Issues a duplicate request once the primary is slower than the hedge delay."""
+
+    def __init__(self, percentile=LLM_HEDGE_PERCENTILE, min_delay=LLM_HEDGE_MIN_DELAY,
+                 min_samples=LLM_HEDGE_MIN_SAMPLES, window=LLM_HEDGE_WINDOW, budget=LLM_HEDGE_BUDGET):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self._latencies = deque(maxlen=window)
+        self._tokens = 1.0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'budget_denied': 0, 'slot_denied': 0}
+
+    # -- bookkeeping ---------------------------------------------------------
+
+    def _observe(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def hedge_delay(self):
+        """Current delay before hedging, or None while too few samples exist."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile / 100 * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _start(self):
+        """Count a request and earn its share of the hedge budget."""
+        with self._lock:
+            self._stats['requests'] += 1
+            self._tokens = min(10.0, self._tokens + self.budget)
+
+    def _has_budget(self):
+        with self._lock:
+            return self._tokens >= 1.0
+
+    def _take_budget(self):
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self._stats['hedged'] += 1
+                return True
+            self._stats['budget_denied'] += 1
+            return False
+
+    def _refund_budget(self):
+        """Give back a hedge taken with _take_budget that could not be issued."""
+        with self._lock:
+            self._tokens += 1.0
+            self._stats['hedged'] -= 1
+            self._stats['slot_denied'] += 1
+
+    def _deny_budget(self):
+        with self._lock:
+            self._stats['budget_denied'] += 1
+
+    def _record_win(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self._stats['hedge_wins'] += 1
+
+    # -- sync ----------------------------------------------------------------
+
+    def _submit(self, fn):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        context = contextvars.copy_context()
+        running = threading.Event()
+
+        def timed():
+            running.set()
+            started = time.perf_counter()
+            result = context.run(fn)
+            self._observe(time.perf_counter() - started)
+            return result
+        return self._executor.submit(timed), running
+
+    def call(self, fn, hedge=None):
+        """Run fn(), hedging with a second fn() if it is slower than the hedge delay.
+
+        Without a hedge delay yet or budget for a hedge, fn() runs on the
+        calling thread; only calls that may be hedged use the worker pool.
+        hedge(), when given, returns the function to run as the hedge, or
+        None to skip it.
+        """
+        self._start()
+        delay = self.hedge_delay()
+        if delay is None or not self._has_budget():
+            started = time.perf_counter()
+            result = fn()
+            latency = time.perf_counter() - started
+            self._observe(latency)
+            if delay is not None and latency > delay:
+                self._deny_budget()
+            return result
+
+        primary, running = self._submit(fn)
+        # Time spent queued for a worker does not count toward the hedge delay
+        running.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_budget():
+            return primary.result()
+        hedge_fn = fn if hedge is None else hedge()
+        if hedge_fn is None:
+            self._refund_budget()
+            return primary.result()
+
+        hedge, _ = self._submit(hedge_fn)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # A running thread cannot be interrupted, and a queued hedge
+                    # already holds its limiter slot: the loser finishes in the
+                    # background and its result is dropped
+                    self._record_win(future is hedge)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    # -- async ---------------------------------------------------------------
+
+    async def _timed(self, coro_fn):
+        started = time.perf_counter()
+        result = await coro_fn()
+        self._observe(time.perf_counter() - started)
+        return result
+
+    async def acall(self, coro_fn, hedge=None):
+        """Async version of call; the losing request is cancelled."""
+        self._start()
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed(coro_fn)
+
+        primary = asyncio.ensure_future(self._timed(coro_fn))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done or not self._take_budget():
+            return await primary
+        hedge_fn = coro_fn if hedge is None else hedge()
+        if hedge_fn is None:
+            self._refund_budget()
+            return await primary
+
+        hedge = asyncio.ensure_future(self._timed(hedge_fn))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_win(task is hedge)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            requests, hedged = self._stats['requests'], self._stats['hedged']
+            return {
+                'enabled': True,
+                **self._stats,
+                'hedge_rate': round(hedged / requests, 4) if requests else 0.0,
+                'win_rate': round(self._stats['hedge_wins'] / hedged, 4) if hedged else 0.0,
+                'hedge_delay_s': round(delay, 4) if delay is not None else None,
+                'samples': len(self._latencies),
+            }
@@ -0,0 +1,261 @@
+"""Adaptive (AIMD) client-side concurrency limiter for LLM calls.
+
+The concurrency limit grows additively while calls succeed within the
+latency target and is cut multiplicatively when the provider throttles us
+(429 / RESOURCE_EXHAUSTED). Callers over the limit wait in one FIFO queue
+shared by threads and event loops, and throttled calls are retried after a
+backoff instead of failing straight away.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+LLM_LIMITER_ENABLED = os.getenv("LLM_LIMITER_ENABLED", "true").lower() == "true"
+LLM_LIMITER_INITIAL = float(os.getenv("LLM_LIMITER_INITIAL", "16"))
+LLM_LIMITER_MIN = float(os.getenv("LLM_LIMITER_MIN", "1"))
+LLM_LIMITER_MAX = float(os.getenv("LLM_LIMITER_MAX", "256"))
+# Additive step per full window of successes, and multiplicative cut on throttling
+LLM_LIMITER_INCREASE = float(os.getenv("LLM_LIMITER_INCREASE", "1"))
+LLM_LIMITER_DECREASE = float(os.getenv("LLM_LIMITER_DECREASE", "0.5"))
+# Successes slower than this (seconds) do not grow the limit; 0 disables the check
+LLM_LIMITER_LATENCY_TARGET = float(os.getenv("LLM_LIMITER_LATENCY_TARGET", "10"))
+# At most one cut per cooldown, so one burst of 429s is one congestion signal
+LLM_LIMITER_COOLDOWN = float(os.getenv("LLM_LIMITER_COOLDOWN", "1"))
+LLM_LIMITER_RETRIES = int(os.getenv("LLM_LIMITER_RETRIES", "4"))
+LLM_LIMITER_BACKOFF = float(os.getenv("LLM_LIMITER_BACKOFF", "0.5"))
+LLM_LIMITER_QUEUE_TIMEOUT = float(os.getenv("LLM_LIMITER_QUEUE_TIMEOUT", "60"))
+
+SUCCESS, THROTTLED, FAILED = "success", "throttled", "failed"
+
+
+class LimiterTimeout(Exception):
+    """Raised when a caller waited longer than the queue timeout for a slot."""
+
+
+def is_throttle_error(error):
+    """True for provider rate-limit / quota errors."""
+    for attr in ('status_code', 'code'):
+        if getattr(error, attr, None) == 429:
+            return True
+    message = str(error).upper()
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "RATE LIMIT" in message
+
+
+def _set_if_pending(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a FIFO wait queue for sync and async callers."""
+
+    def __init__(self, initial=LLM_LIMITER_INITIAL, min_limit=LLM_LIMITER_MIN, max_limit=LLM_LIMITER_MAX,
+                 increase=LLM_LIMITER_INCREASE, decrease=LLM_LIMITER_DECREASE,
+                 latency_target=LLM_LIMITER_LATENCY_TARGET, cooldown=LLM_LIMITER_COOLDOWN,
+                 retries=LLM_LIMITER_RETRIES, backoff=LLM_LIMITER_BACKOFF, queue_timeout=LLM_LIMITER_QUEUE_TIMEOUT):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.retries = retries
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # (loop, future) for async waiters, (None, threading.Event) for threads
+        self._waiters = deque()
+        self._last_cut = 0.0
+        self._waits = deque(maxlen=1000)
+        self._stats = {'acquired': 0, 'queued': 0, 'throttled': 0, 'retries': 0,
+                       'cuts': 0, 'timeouts': 0, 'failures': 0}
+
+    # -- slots -------------------------------------------------------------
+
+    def _has_capacity(self):
+        return self._in_flight < max(1, int(self.limit))
+
+    def _dispatch(self):
+        """Hand free slots to queued callers in FIFO order (lock held)."""
+        while self._waiters and self._has_capacity():
+            loop, waiter = self._waiters.popleft()
+            self._in_flight += 1
+            if loop is None:
+                waiter.set()
+            else:
+                loop.call_soon_threadsafe(_set_if_pending, waiter)
+
+    def _granted(self, started):
+        self._stats['acquired'] += 1
+        self._waits.append(time.perf_counter() - started)
+
+    def acquire(self):
+        started = time.perf_counter()
+        with self._lock:
+            if self._has_capacity() and not self._waiters:
+                self._in_flight += 1
+                self._granted(started)
+                return
+            event = threading.Event()
+            entry = (None, event)
+            self._waiters.append(entry)
+            self._stats['queued'] += 1
+
+        if not event.wait(self.queue_timeout or None):
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    self._stats['timeouts'] += 1
+                    raise LimiterTimeout(f"Waited {self.queue_timeout}s for an LLM concurrency slot")
+        with self._lock:
+            self._granted(started)
+
+    async def aacquire(self):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._has_capacity() and not self._waiters:
+                self._in_flight += 1
+                self._granted(started)
+                return
+            future = loop.create_future()
+            entry = (loop, future)
+            self._waiters.append(entry)
+            self._stats['queued'] += 1
+
+        try:
+            await asyncio.wait_for(future, self.queue_timeout or None)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._lock:
+                queued = entry in self._waiters
+                if queued:
+                    self._waiters.remove(entry)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._stats['timeouts'] += 1
+            if not queued:
+                # The slot was handed over just as we gave up; give it back
+                self.release(None)
+            if isinstance(e, asyncio.TimeoutError):
+                raise LimiterTimeout(f"Waited {self.queue_timeout}s for an LLM concurrency slot") from e
+            raise
+        with self._lock:
+            self._granted(started)
+
+    def try_acquire(self):
+        """Take a slot only if one is free right now, without queueing."""
+        with self._lock:
+            if self._has_capacity() and not self._waiters:
+                self._in_flight += 1
+                self._granted(time.perf_counter())
+                return True
+            return False
+
+    def release(self, outcome, latency=0.0):
+        """Free a slot and adapt the limit to the call outcome."""
+        with self._lock:
+            self._in_flight -= 1
+            if outcome == SUCCESS:
+                if not self.latency_target or latency <= self.latency_target:
+                    self.limit = min(self.max_limit, self.limit + self.increase / max(self.limit, 1.0))
+            elif outcome == THROTTLED:
+                self._stats['throttled'] += 1
+                now = time.monotonic()
+                if now - self._last_cut >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_cut = now
+                    self._stats['cuts'] += 1
+            elif outcome == FAILED:
+                self._stats['failures'] += 1
+            self._dispatch()
+
+    # -- calls -------------------------------------------------------------
+
+    def _backoff_delay(self, attempt):
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def call(self, fn):
+        """Run fn() under the limiter, retrying throttled calls after a backoff."""
+        for attempt in range(self.retries + 1):
+            self.acquire()
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self.release(THROTTLED if throttled else FAILED)
+                if not throttled or attempt == self.retries:
+                    raise
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(self._backoff_delay(attempt))
+                continue
+            self.release(SUCCESS, time.perf_counter() - started)
+            return result
+
+    async def acall(self, coro_fn):
+        """Async version of call."""
+        for attempt in range(self.retries + 1):
+            await self.aacquire()
+            started = time.perf_counter()
+            try:
+                result = await coro_fn()
+            except asyncio.CancelledError:
+                self.release(None)
+                raise
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self.release(THROTTLED if throttled else FAILED)
+                if not throttled or attempt == self.retries:
+                    raise
+                with self._lock:
+                    self._stats['retries'] += 1
+                await asyncio.sleep(self._backoff_delay(attempt))
+                continue
+            self.release(SUCCESS, time.perf_counter() - started)
+            return result
+
+    def call_acquired(self, fn):
+        """Run fn() in a slot taken with try_acquire and release it; no retries."""
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self.release(THROTTLED if is_throttle_error(e) else FAILED)
+            raise
+        self.release(SUCCESS, time.perf_counter() - started)
+        return result
+
+    async def acall_acquired(self, coro_fn):
+        """Async version of call_acquired."""
+        started = time.perf_counter()
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            self.release(None)
+            raise
+        except Exception as e:
+            self.release(THROTTLED if is_throttle_error(e) else FAILED)
+            raise
+        self.release(SUCCESS, time.perf_counter() - started)
+        return result
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                'enabled': True,
+                'limit': round(self.limit, 2),
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiters),
+                **self._stats,
+                'wait_avg_s': round(sum(waits) / len(waits), 4) if waits else 0.0,
+                'wait_p95_s': round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+                'wait_max_s': round(waits[-1], 4) if waits else 0.0,
+            }
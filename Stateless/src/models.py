@@ -2,7 +2,8 @@
 Data models and state definitions for the joke generation agent.
 """
 
-from typing import TypedDict
+from typing import TypedDict, Optional
+from pydantic import BaseModel, Field
 
 
 class JokeState(TypedDict):
@@ -13,7 +14,15 @@ class JokeState(TypedDict):
         topic (str): The topic for which to generate a joke
         joke (str): The generated joke content
         explanation (str): The explanation of the joke
+        error (str): Set when a node fell back to a placeholder answer
     """
     topic: str
     joke: str
     explanation: str
+    error: Optional[str]
+
+
+class JokeWithExplanation(BaseModel):
+    """Schema of the single-call structured answer."""
+    joke: str = Field(..., min_length=1)
+    explanation: str = Field(..., min_length=1)
@@ -0,0 +1,95 @@
+"""Readiness: the warm-up an instance finishes before it should take traffic.
+
+GET /health only says the process is alive. GET /ready answers 503 until
+every check below has passed, so nginx and the load balancer keep traffic
+off a cold instance:
+
+- workflow: the graph is built
+- llm: the pooled clients for MODEL_NAME and FALLBACK_MODEL_NAME are built;
+  with READY_LLM_PRIME=true one tiny call also opens the keep-alive connection
+- caches: the response cache is opened and its memory tier preloaded, and
+  the joke pool (with its synonyms file) is loaded
+
+A failing check is retried every READY_RETRY_INTERVAL seconds.
+"""
+
+import asyncio
+import os
+import time
+from .config import get_llm, MODEL_NAME, FALLBACK_MODEL_NAME, ASYNC_EXECUTION
+from .cache import get_response_cache
+from .graph import aget_workflow
+from .topics import get_joke_pool
+from .startup import mark_ready
+
+READY_LLM_PRIME = os.getenv("READY_LLM_PRIME", "false").lower() == "true"
+READY_LLM_PRIME_PROMPT = os.getenv("READY_LLM_PRIME_PROMPT", "Reply with OK.")
+READY_RETRY_INTERVAL = float(os.getenv("READY_RETRY_INTERVAL", "5"))
+
+_checks = {}  # check name -> {'ready': bool, 'ms' or 'error', details...}
+_ready = False
+
+
+async def _check_workflow():
+    await aget_workflow()
+
+
+async def _check_llm():
+    models = [MODEL_NAME] + ([FALLBACK_MODEL_NAME] if FALLBACK_MODEL_NAME else [])
+    # Building a client imports its SDK; keep that off the event loop
+    clients = [await asyncio.to_thread(get_llm, model) for model in models]
+    if not READY_LLM_PRIME:
+        return {'models': models}
+    # Straight to the pooled client requests use (same sync/async transport),
+    # bypassing the cache, limiter and breaker
+    if ASYNC_EXECUTION:
+        await clients[0].ainvoke(READY_LLM_PRIME_PROMPT)
+    else:
+        await asyncio.to_thread(clients[0].invoke, READY_LLM_PRIME_PROMPT)
+    return {'models': models, 'primed': True}
+
+
+async def _check_caches():
+    cache = await asyncio.to_thread(get_response_cache)
+    # Loads TOPIC_SYNONYMS_FILE when the joke pool is enabled
+    await asyncio.to_thread(get_joke_pool)
+    if cache is None:
+        return {'response_cache': 'disabled'}
+    return {'preloaded': await asyncio.to_thread(cache.preload)}
+
+
+async def _run(name, check):
+    """Run a check until it passes, recording the outcome of each attempt."""
+    while True:
+        started = time.perf_counter()
+        try:
+            details = await check() or {}
+        except Exception as e:
+            _checks[name] = {'ready': False, 'error': str(e)}
+            print(f"Readiness check {name} failed: {str(e)} (retrying in {READY_RETRY_INTERVAL}s)")
+            await asyncio.sleep(READY_RETRY_INTERVAL)
+            continue
+        _checks[name] = {'ready': True, 'ms': round((time.perf_counter() - started) * 1000, 1), **details}
+        return
+
+
+async def warm_up():
+    """Run every check, retrying failures, then mark the instance ready."""
+    global _ready
+    for name in ('workflow', 'llm', 'caches'):
+        _checks.setdefault(name, {'ready': False})
+    await asyncio.gather(
+        _run('workflow', _check_workflow),
+        _run('llm', _check_llm),
+        _run('caches', _check_caches),
+    )
+    _ready = True
+    mark_ready()
+
+
+def is_ready():
+    return _ready
+
+
+def get_readiness():
+    return {'ready': _ready, 'checks': {name: dict(check) for name, check in _checks.items()}}
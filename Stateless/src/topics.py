@@ -0,0 +1,175 @@
+"""Topic canonicalization and a pool of cached jokes per canonical topic.
+
+Traffic is dominated by small variations of the same topics ("AI", "ai ",
+"Artificial Intelligence"). Topics are folded to a canonical form, mapped
+through a synonym table and optionally matched against known topics by
+character n-gram similarity, so all variants share one warm joke pool.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+JOKE_POOL_ENABLED = os.getenv("JOKE_POOL_ENABLED", "false").lower() == "true"
+# Jokes kept per canonical topic, and how many are needed before serving from the pool
+JOKE_POOL_SIZE = int(os.getenv("JOKE_POOL_SIZE", "8"))
+JOKE_POOL_MIN = int(os.getenv("JOKE_POOL_MIN", "3"))
+# Fraction of requests on a warm pool that still generate a fresh joke
+JOKE_POOL_FRESHNESS = float(os.getenv("JOKE_POOL_FRESHNESS", "0.2"))
+TOPIC_SYNONYMS_FILE = os.getenv("TOPIC_SYNONYMS_FILE")
+TOPIC_SIMILARITY_ENABLED = os.getenv("TOPIC_SIMILARITY_ENABLED", "false").lower() == "true"
+TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.75"))
+
+DEFAULT_SYNONYMS = {
+    "ai": "artificial intelligence",
+    "a.i.": "artificial intelligence",
+    "ml": "machine learning",
+    "llm": "large language models",
+    "llms": "large language models",
+    "js": "javascript",
+    "py": "python",
+    "k8s": "kubernetes",
+    "cats": "cat",
+    "dogs": "dog",
+}
+
+
+def fold_topic(topic):
+    """Case, whitespace and unicode folding: "  Café  AI!" -> "cafe ai"."""
+    text = unicodedata.normalize("NFKD", topic or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip(" .,;:!?\"'")
+
+
+def load_synonyms(path=TOPIC_SYNONYMS_FILE):
+    """Default synonym table, extended by a JSON {alias: canonical} file."""
+    synonyms = dict(DEFAULT_SYNONYMS)
+    if path:
+        with open(path) as f:
+            synonyms.update(json.load(f))
+    return {fold_topic(alias): fold_topic(canonical) for alias, canonical in synonyms.items()}
+
+
+def _ngrams(text, n=3):
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+class NGramIndex:
+    """Character trigram index returning the most similar known topic (Jaccard)."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self._grams = {}
+        self._postings = defaultdict(set)
+
+    def add(self, topic):
+        if topic in self._grams:
+            return
+        grams = _ngrams(topic)
+        self._grams[topic] = grams
+        for gram in grams:
+            self._postings[gram].add(topic)
+
+    def match(self, topic):
+        grams = _ngrams(topic)
+        candidates = set()
+        for gram in grams:
+            candidates |= self._postings.get(gram, set())
+
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            other = self._grams[candidate]
+            score = len(grams & other) / len(grams | other)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best if best_score >= self.threshold else None
+
+
+class JokePool:
+    """Bounded pool of generated jokes per canonical topic."""
+
+    def __init__(self, size=JOKE_POOL_SIZE, min_size=JOKE_POOL_MIN, freshness=JOKE_POOL_FRESHNESS,
+                 synonyms=None, similarity=TOPIC_SIMILARITY_ENABLED):
+        self.size = size
+        self.min_size = min_size
+        self.freshness = freshness
+        self.synonyms = load_synonyms() if synonyms is None else synonyms
+        self.index = NGramIndex(TOPIC_SIMILARITY_THRESHOLD) if similarity else None
+        self._jokes = defaultdict(list)
+        self._lock = threading.Lock()
+        self._stats = {'served_from_pool': 0, 'generated': 0, 'synonym_hits': 0, 'similarity_hits': 0}
+
+    def canonicalize(self, topic):
+        """Canonical topic used as the pool key and in the joke prompt."""
+        folded = fold_topic(topic)
+        canonical = self.synonyms.get(folded, folded)
+
+        with self._lock:
+            if canonical != folded:
+                self._stats['synonym_hits'] += 1
+            if self.index is not None and canonical not in self._jokes:
+                match = self.index.match(canonical)
+                if match is not None:
+                    self._stats['similarity_hits'] += 1
+                    return match
+        return canonical or "general"
+
+    def sample(self, canonical):
+        """A cached joke when the pool is warm, or None to generate a fresh one."""
+        with self._lock:
+            jokes = self._jokes.get(canonical)
+            if not jokes or len(jokes) < self.min_size:
+                return None
+            if random.random() < self.freshness:
+                return None
+            self._stats['served_from_pool'] += 1
+            return random.choice(jokes)
+
+    def add(self, canonical, joke):
+        with self._lock:
+            self._stats['generated'] += 1
+            jokes = self._jokes[canonical]
+            jokes.append(joke)
+            if len(jokes) > self.size:
+                jokes.pop(0)
+            if self.index is not None:
+                self.index.add(canonical)
+
+    def stats(self):
+        with self._lock:
+            warm = sum(1 for jokes in self._jokes.values() if len(jokes) >= self.min_size)
+            return {
+                'enabled': True,
+                'topics': len(self._jokes),
+                'warm_topics': warm,
+                'freshness': self.freshness,
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_joke_pool():
+    """Process-wide joke pool, or None when JOKE_POOL_ENABLED is off."""
+    global _pool
+    if not JOKE_POOL_ENABLED:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = JokePool()
+    return _pool
+
+
+def get_joke_pool_stats():
+    pool = get_joke_pool()
+    return pool.stats() if pool is not None else {'enabled': False}
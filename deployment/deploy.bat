@@ -53,9 +53,9 @@ REM Wait for services to be healthy
 echo ⏳ Waiting for services to be healthy...
 timeout /t 10 /nobreak
 
-REM Health check
+REM Readiness check (/health only shows the process is up)
 echo 🏥 Performing health check...
-curl -f http://localhost:8000/health >nul 2>&1
+curl -f http://localhost:8000/ready >nul 2>&1
 if %errorlevel% equ 0 (
     echo ✅ Deployment successful! Service is healthy.
     echo 🌐 API is available at: http://localhost:8000
@@ -51,9 +51,9 @@ fi
 echo "⏳ Waiting for services to be healthy..."
 sleep 10
 
-# Health check
+# Readiness check (/health only shows the process is up)
 echo "🏥 Performing health check..."
-if curl -f http://localhost:8000/health > /dev/null 2>&1; then
+if curl -f http://localhost:8000/ready > /dev/null 2>&1; then
     echo "✅ Deployment successful! Service is healthy."
     echo "🌐 API is available at: http://localhost:8000"
     echo "📚 API documentation: http://localhost:8000/docs"